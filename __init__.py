@@ -1,11 +1,12 @@
 # --- START OF FILE __init__.py ---
 from aiohttp import web
 import os
+import logging
 import folder_paths
 from .nodes import *
 from .constants import FORCE_HTTPS, SEPERATE_USERS, MATCH_HEADERS
 from .globals import (
-    app, ip_filter, sanitizer, timeout, jwt_auth, access_control,
+    app, routes, ip_filter, sanitizer, timeout, jwt_auth, access_control,
     instance, current_username_var
 )
 from .utils import watcher
@@ -13,13 +14,14 @@ from .utils.bootstrap import ensure_groups_config
 from .routes import static, auth, admin, user, workflow_routes
 from .utils.sfw_intercept.reactor_sfw_intercept import _load_reactor_module
 from .utils.sfw_intercept.nsfw_guard import (
-    should_block_image_for_current_user,
+    should_block_image_for_user_async,
     set_latest_prompt_user,
 )
 from .utils.sfw_intercept.node_interceptor import install_node_interceptor
-
 import server
 
+LOG = logging.getLogger("usgromana.middleware")
+
 WEB_DIRECTORY = "./web"
 
 # Export the public API for other extensions
@@ -63,7 +65,7 @@ async def workflow_interceptor_middleware(request, handler):
     if "prompt" in path and method in ("POST", "PUT"):
         # Let nsfw_guard handle defaulting/guest logic.
         set_latest_prompt_user(username)
-        print(f"[Usgromana::Middleware] PROMPT CAPTURE path={path} user={username!r}")
+        LOG.debug("[Usgromana::Middleware] PROMPT CAPTURE path=%s user=%r", path, username)
 
     # --- Case A: /view ---
     if path == "/view" and method == "GET":
@@ -80,7 +82,7 @@ async def workflow_interceptor_middleware(request, handler):
             img_path = os.path.join(target_dir, filename)
 
             if os.path.isfile(img_path):
-                if should_block_image_for_current_user(img_path):
+                if await should_block_image_for_user_async(img_path, username or "guest"):
                     return web.Response(status=403, text="NSFW Blocked")
 
     # --- Case B: /static_gallery ---
@@ -88,7 +90,7 @@ async def workflow_interceptor_middleware(request, handler):
         rel = path[len("/static_gallery/") :].lstrip("/\\")
         out_dir = folder_paths.get_output_directory()
         img_path = os.path.join(out_dir, rel)
-        if os.path.isfile(img_path) and should_block_image_for_current_user(img_path):
+        if os.path.isfile(img_path) and await should_block_image_for_user_async(img_path, username or "guest"):
             return web.Response(status=403, text="NSFW Blocked")
 
     return await handler(request)
@@ -108,6 +110,7 @@ app.middlewares.append(
 app.middlewares.append(jwt_auth.create_jwt_middleware(
     public=("/login", "/logout", "/register"),
     public_prefixes=("/usgromana", "/usgromana-gallery", "/assets", "/static"),
+    identify_prefixes=("/usgromana/api/",),
 ))
 
 # Now that jwt_auth can populate request.user, we can safely
@@ -124,21 +127,15 @@ watcher.register(app)
 
 install_node_interceptor()
 
-# Ensure routes are added to the app
-# In ComfyUI, instance.routes should be automatically added by PromptServer,
-# but we'll explicitly add them to ensure they're registered
-from .globals import routes
-try:
-    # Check if routes are already in the app
-    routes_in_app = any(r._resource is routes for r in app.router.routes() if hasattr(r, '_resource'))
-    if not routes_in_app:
-        app.add_routes(routes)
-except Exception:
-    # Try to add anyway - might work even if check fails
-    try:
-        app.add_routes(routes)
-    except Exception:
-        pass  # ComfyUI may handle route registration automatically
+# Register all Usgromana routes on PromptServer's shared route table.
+# Each route module exposes a module-level ROUTES list; ComfyUI adds the
+# table to the app after custom nodes load and mirrors every route under
+# /api, which the settings UI relies on (api.fetchApi("/usgromana/api/...")).
+for route_def in (*static.ROUTES, *auth.ROUTES, *admin.ROUTES, *user.ROUTES):
+    if isinstance(route_def, web.StaticDef):
+        routes.static(route_def.prefix, route_def.path, **route_def.kwargs)
+    else:
+        routes.route(route_def.method, route_def.path, **route_def.kwargs)(route_def.handler)
 
 print("------------------------------------------")
 print("[Usgromana] Security System Initialized.")
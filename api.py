@@ -39,6 +39,7 @@ from typing import Optional, Union
 # Optional dependencies - will be imported when needed
 try:
     import torch
+    import torch.nn.functional as F
     TORCH_AVAILABLE = True
 except ImportError:
     TORCH_AVAILABLE = False
@@ -55,6 +56,10 @@ try:
 except ImportError:
     NUMPY_AVAILABLE = False
 
+# Images larger than this are downsampled on-device before leaving for PIL;
+# the classifier resizes to ~224px itself, so nothing is lost
+THUMBNAIL_SIZE = (256, 256)
+
 # Try to import the NSFW guard functions
 # Handle multiple import strategies for maximum compatibility
 _NSFW_GUARD_AVAILABLE = False
@@ -322,9 +327,16 @@ def check_tensor_nsfw(images_tensor, threshold: float = 0.5) -> bool:
         if images_tensor is None or len(images_tensor) == 0:
             return False
         
-        # Convert tensor to PIL Image
-        i = 255. * images_tensor[0].cpu().numpy()
-        img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
+        # Shrink to a thumbnail on the tensor's own device so only a small frame is copied to host
+        image = images_tensor[0]
+        if image.shape[0] * image.shape[1] > THUMBNAIL_SIZE[0] * THUMBNAIL_SIZE[1]:
+            image = F.interpolate(
+                image.permute(2, 0, 1).unsqueeze(0), size=THUMBNAIL_SIZE, mode="bilinear", antialias=True
+            )[0].permute(1, 2, 0)
+
+        # Convert tensor to PIL Image: scale/clamp/quantize on the tensor's own device,
+        # then a single uint8 transfer (no full-size float intermediates in numpy)
+        img = Image.fromarray(image.mul(255).clamp_(0, 255).to(torch.uint8).cpu().numpy())
         
         # Run classification
         results = pipeline(img)
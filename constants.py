@@ -2,7 +2,7 @@
 import os
 import json
 import warnings
-import uuid
+import secrets
 import base64
 
 # --- Base Directories ---
@@ -33,6 +33,7 @@ GROUPS_CONFIG_FILE = os.path.join(CURRENT_DIR, "users", "usgromana_groups.json")
 DEFAULT_GROUP_CONFIG_PATH = os.path.join(CURRENT_DIR, "users", "defaults", "default_group_config.json")
 WHITELIST_FILE = os.path.join(CURRENT_DIR, "users", "whitelist.txt")
 BLACKLIST_FILE = os.path.join(CURRENT_DIR, "users", "blacklist.txt")
+NSFW_INDEX_FILE = os.path.join(CURRENT_DIR, "users", "nsfw_index.sqlite")
 LOG_FILE = os.path.join(CURRENT_DIR, config_data.get("log", "usgromana.log"))
 
 # --- Configuration Values ---
@@ -40,7 +41,7 @@ LOG_LEVELS = config_data.get("log_levels", ["INFO"])
 SECRET_KEY = base64.urlsafe_b64decode(os.getenv(config_data.get("secret_key_env", "SECRET_KEY")))  
 if not SECRET_KEY:
     warnings.warn("[Usgromana] SECRET_KEY not set. Using random key (logouts on restart).")
-    SECRET_KEY = "".join([str(uuid.uuid4().hex) for _ in range(128)])
+    SECRET_KEY = secrets.token_hex(64)
 
 TOKEN_EXPIRE_MINUTES = 60 * config_data.get("access_token_expiration_hours", 12)
 MAX_TOKEN_EXPIRE_MINUTES = 60 * config_data.get("max_access_token_expiration_hours", 8760)
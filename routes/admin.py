@@ -1,26 +1,25 @@
 # --- START OF FILE routes/admin.py ---
 from aiohttp import web
-from ..globals import routes, jwt_auth, users_db, ip_filter
+from ..globals import jwt_auth, users_db, ip_filter
 from ..constants import GROUPS_CONFIG_FILE, DEFAULT_GROUP_CONFIG_PATH, WHITELIST_FILE, BLACKLIST_FILE, USERS_FILE
 from ..utils.json_utils import load_json_file, save_json_file
 from ..utils.admin_logic import patch_user_group, delete_user_record
 from ..utils.bootstrap import load_default_groups
 
 def is_admin(request):
+    ident = request.get("_jwt_user")
+    if ident is not None: return ident["is_admin"]
     token = jwt_auth.get_token_from_request(request)
     if not token: return False
     try:
         p = jwt_auth.decode_access_token(token)
-        _, u = users_db.get_user(p['username'])
-        return u.get('admin', False) or "admin" in u.get('groups', [])
+        return users_db.is_admin(p['username'])
     except: return False
 
-@routes.get("/usgromana/api/groups")
 async def api_groups(request):
     default_cfg = load_default_groups()
     return web.json_response({"groups": load_json_file(GROUPS_CONFIG_FILE, default_cfg)})
 
-@routes.put("/usgromana/api/groups")
 async def api_update_groups(request):
     if not is_admin(request): return web.json_response({"error": "Admin only"}, status=403)
     try:
@@ -37,7 +36,6 @@ async def api_update_groups(request):
     except Exception as e:
         return web.json_response({"error": str(e)}, status=500)
 
-@routes.get("/usgromana/api/users")
 async def api_users(request):
     # Security: You might want to restrict this to admins only too
     if not is_admin(request): return web.json_response({"error": "Admin only"}, status=403)
@@ -48,14 +46,13 @@ async def api_users(request):
     for u in iterable:
         users_list.append({
             "username": u.get("username", "unknown"),
-            "groups": [g.lower() for g in u.get("groups", ["user"])],
+            "groups": u.get("groups") or ["user"],
             "is_admin": u.get("admin", False),
             # NEW: per-user SFW flag; default = True (SFW enabled)
             "sfw_check": u.get("sfw_check", True),
         })
     return web.json_response({"users": users_list})
 
-@routes.put("/usgromana/api/users/{target_user}")
 async def api_update_user_route(request):
     if not is_admin(request):
         return web.json_response({"error": "Admin only"}, status=403)
@@ -74,7 +71,6 @@ async def api_update_user_route(request):
         return web.json_response({"status": "ok"})
     return web.Response(status=404)
 
-@routes.delete("/usgromana/api/users/{target_user}")
 async def api_delete_user_route(request):
     if not is_admin(request): return web.json_response({"error": "Admin only"}, status=403)
     target = request.match_info["target_user"]
@@ -85,15 +81,13 @@ async def api_delete_user_route(request):
     if result is False: return web.Response(status=404)
     return web.json_response({"status": "ok"})
 
-@routes.get("/usgromana/api/ip-lists")
 async def api_ip_lists(request):
-    whitelist, blacklist = ip_filter.load_filter_list()
+    whitelist, blacklist = ip_filter.load_filter_list_str()
     return web.json_response({
-        "whitelist": [str(ip) for ip in (whitelist or [])],
-        "blacklist": [str(ip) for ip in (blacklist or [])]
+        "whitelist": whitelist,
+        "blacklist": blacklist
     })
 
-@routes.put("/usgromana/api/ip-lists")
 async def api_update_ip_lists(request):
     if not is_admin(request): 
         return web.json_response({"error": "Admin only"}, status=403)
@@ -144,7 +138,6 @@ async def api_update_ip_lists(request):
     except Exception as e:
         return web.json_response({"error": str(e)}, status=500)
 
-@routes.post("/usgromana/api/nsfw-management")
 async def api_nsfw_management(request):
     """Admin-only NSFW management endpoints."""
     if not is_admin(request):
@@ -164,7 +157,7 @@ async def api_nsfw_management(request):
         
         # Run blocking operations in executor to avoid blocking the event loop
         import asyncio
-        loop = asyncio.get_event_loop()
+        loop = asyncio.get_running_loop()
         
         if action == "scan_all":
             force_rescan = bool(data.get("force_rescan", False))
@@ -214,4 +207,15 @@ async def api_nsfw_management(request):
         import traceback
         print(f"[Usgromana] NSFW management error: {e}")
         traceback.print_exc()
-        return web.json_response({"error": str(e)}, status=500)
\ No newline at end of file
+        return web.json_response({"error": str(e)}, status=500)
+
+ROUTES = [
+    web.get("/usgromana/api/groups", api_groups),
+    web.put("/usgromana/api/groups", api_update_groups),
+    web.get("/usgromana/api/users", api_users),
+    web.put("/usgromana/api/users/{target_user}", api_update_user_route),
+    web.delete("/usgromana/api/users/{target_user}", api_delete_user_route),
+    web.get("/usgromana/api/ip-lists", api_ip_lists),
+    web.put("/usgromana/api/ip-lists", api_update_ip_lists),
+    web.post("/usgromana/api/nsfw-management", api_nsfw_management),
+]
\ No newline at end of file
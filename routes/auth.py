@@ -1,25 +1,37 @@
 # --- START OF FILE routes/auth.py ---
 import os
 import uuid
+import asyncio
 from aiohttp import web
-from ..globals import routes, users_db, jwt_auth, logger, timeout
+from ..globals import users_db, jwt_auth, logger, timeout
 from ..constants import HTML_DIR
 from ..utils.bootstrap import ensure_groups_config
 from ..utils.ip_filter import get_ip
 from ..utils import user_env
 
-@routes.get("/register")
+REGISTER_HTML_PATH = os.path.join(HTML_DIR, "register.html")
+LOGIN_HTML_PATH = os.path.join(HTML_DIR, "login.html")
+
+def _load_register_html():
+    """
+    Read register.html once and pre-render both variants of the
+    {{ X-Admin-User }} placeholder, keyed by "is this the first admin?".
+    Returns None if the template is missing.
+    """
+    if not os.path.exists(REGISTER_HTML_PATH): return None
+    with open(REGISTER_HTML_PATH, "r") as f: html_content = f.read()
+    return {
+        True: html_content.replace("{{ X-Admin-User }}", "true").encode("utf-8"),
+        False: html_content.replace("{{ X-Admin-User }}", "false").encode("utf-8"),
+    }
+
+REGISTER_HTML = _load_register_html()
+
 async def get_register(request: web.Request) -> web.Response:
-    path = os.path.join(HTML_DIR, "register.html")
-    if not os.path.exists(path): return web.Response(text="register.html not found", status=404)
-    with open(path, "r") as f: html_content = f.read()
-    if not users_db.load_users():
-        html_content = html_content.replace("{{ X-Admin-User }}", "true")
-    else:
-        html_content = html_content.replace("{{ X-Admin-User }}", "false")
-    return web.Response(body=html_content, content_type="text/html")
-
-@routes.post("/register")
+    if REGISTER_HTML is None: return web.Response(text="register.html not found", status=404)
+    body = REGISTER_HTML[not users_db.has_any_users]
+    return web.Response(body=body, content_type="text/html")
+
 async def post_register(request: web.Request) -> web.Response:
     sanitized_data = request.get("_sanitized_data", {})
     ip = get_ip(request)
@@ -39,26 +51,37 @@ async def post_register(request: web.Request) -> web.Response:
     if None not in users_db.get_user(new_username):
         return web.json_response({"error": "Username exists"}, status=400)
 
-    users_db.add_user(str(uuid.uuid4()), new_username, new_password, is_first_admin)
+    # bcrypt hashing + the users.json write block; keep them off the event loop.
+    # add_user re-checks both conditions above under its lock, since other
+    # registrations can land while we wait here.
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(
+            None, users_db.add_user, str(uuid.uuid4()), new_username, new_password,
+            is_first_admin, is_first_admin,
+        )
+    except ValueError:
+        return web.json_response({"error": "Username exists"}, status=400)
+    except PermissionError:
+        # Another registration became the first admin; this one had no credentials
+        return web.json_response({"error": "Invalid admin credentials"}, status=403)
 
     # Create directory immediately
     user_env.get_user_workflow_dir(new_username)
 
     if is_first_admin:
-        ensure_groups_config()
+        # Bootstrap does several blocking reads/writes; keep them off the event loop
+        await loop.run_in_executor(None, ensure_groups_config)
 
     logger.registration_success(ip, new_username, username if not is_first_admin else None)
     timeout.remove_failed_attempts(ip)
     return web.json_response({"message": "User registered"})
 
-@routes.get("/login")
 async def get_login(request: web.Request) -> web.Response:
-    if not users_db.load_users(): return web.HTTPFound("/register")
+    if not users_db.has_any_users: return web.HTTPFound("/register")
     if jwt_auth.get_token_from_request(request): return web.HTTPFound("/logout")
-    path = os.path.join(HTML_DIR, "login.html")
-    return web.FileResponse(path) if os.path.exists(path) else web.Response(text="login.html not found", status=404)
+    return web.FileResponse(LOGIN_HTML_PATH) if os.path.exists(LOGIN_HTML_PATH) else web.Response(text="login.html not found", status=404)
 
-@routes.post("/login")
 async def post_login(request: web.Request) -> web.Response:
     sanitized_data = request.get("_sanitized_data", {})
     ip = get_ip(request)
@@ -94,8 +117,15 @@ async def post_login(request: web.Request) -> web.Response:
     timeout.add_failed_attempt(ip)
     return web.json_response({"error": "Invalid credentials"}, status=401)
 
-@routes.get("/logout")
 async def get_logout(request: web.Request) -> web.Response:
     resp = web.HTTPFound("/login")
     resp.del_cookie("jwt_token", path="/")
     return resp
+
+ROUTES = [
+    web.get("/register", get_register),
+    web.post("/register", post_register),
+    web.get("/login", get_login),
+    web.post("/login", post_login),
+    web.get("/logout", get_logout),
+]
@@ -1,7 +1,6 @@
 # --- START OF FILE routes/static.py ---
 import os
 from aiohttp import web
-from ..globals import routes
 from ..constants import CSS_DIR, JS_DIR, ASSETS_DIR, HTML_DIR
 
 # --- FIX: Create directories if they don't exist to prevent crash ---
@@ -13,8 +12,10 @@ for directory in [CSS_DIR, JS_DIR, ASSETS_DIR, HTML_DIR]:
         except Exception as e:
             print(f"[Usgromana] Error creating directory {directory}: {e}")
 
-# Register static routes
+# Static routes, registered by __init__.py together with the API routes
 # (aiohttp will crash if the path doesn't exist on disk, hence the loop above)
-routes.static("/usgromana/css", CSS_DIR)
-routes.static("/usgromana/js", JS_DIR)
-routes.static("/usgromana/assets", ASSETS_DIR)
\ No newline at end of file
+ROUTES = [
+    web.static("/usgromana/css", CSS_DIR),
+    web.static("/usgromana/js", JS_DIR),
+    web.static("/usgromana/assets", ASSETS_DIR),
+]
\ No newline at end of file
@@ -1,14 +1,20 @@
 # --- START OF FILE routes/user.py ---
 from aiohttp import web
-from ..globals import routes, jwt_auth, users_db
+from ..globals import jwt_auth, users_db
 from ..utils import user_env
 import folder_paths
 import os
 import shutil
+import asyncio
 
 # Root of ComfyUI
 COMFY_ROOT = folder_paths.base_path
 
+# Purges are rmtree storms; run them off the event loop and cap how many
+# can hit the disk at once.
+MAX_CONCURRENT_PURGES = 2
+_purge_semaphore = asyncio.Semaphore(MAX_CONCURRENT_PURGES)
+
 
 def get_global_workflows_root() -> str:
     """
@@ -34,8 +40,13 @@ def _get_caller_admin_info(request):
     """
     Returns (is_admin: bool, username: str|None, groups: list[str])
 
-    Used to guard admin-only actions.
+    Used to guard admin-only actions. Reuses the identity the JWT middleware
+    already attached to the request when there is one.
     """
+    ident = request.get("_jwt_user")
+    if ident is not None:
+        return ident["is_admin"], ident["username"], ident["groups"]
+
     token = jwt_auth.get_token_from_request(request)
     if not token:
         return False, None, ["guest"]
@@ -44,15 +55,14 @@ def _get_caller_admin_info(request):
         payload = jwt_auth.decode_access_token(token)
         username = payload.get("username")
         _, rec = users_db.get_user(username)
-        groups = [g.lower() for g in rec.get("groups", [])] if rec else ["guest"]
-        is_admin = bool(rec and (rec.get("admin") or ("admin" in groups)))
+        groups = rec.get("groups", []) if rec else ["guest"]
+        is_admin = users_db.is_admin(rec)
         return is_admin, username, groups
     except Exception as e:
         print(f"[usgromana] admin check error: {e}")
         return False, None, ["guest"]
 
 
-@routes.get("/usgromana/api/me")
 async def api_me(request: web.Request) -> web.Response:
     """
     Basic identity info for the frontend.
@@ -86,7 +96,6 @@ async def api_me(request: web.Request) -> web.Response:
     )
 
 
-@routes.post("/usgromana/api/user-env")
 async def api_user_env(request: web.Request) -> web.Response:
     """
     Admin-only per-user environment + workflow management.
@@ -181,7 +190,9 @@ async def api_user_env(request: web.Request) -> web.Response:
 
     # --- PURGE USER ENV ROOT --------------------------------------
     if action == "purge":
-        user_env.purge_user_root(target_user)
+        async with _purge_semaphore:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, user_env.purge_user_root, target_user)
         msg = f"Purged environment folders for user '{target_user}'."
         print(f"[usgromana] {msg}")
         return web.json_response({"user": target_user, "message": msg})
@@ -283,7 +294,6 @@ async def api_user_env(request: web.Request) -> web.Response:
     return web.json_response({"error": f"Unknown action '{action}'"}, status=400)
 
 
-@routes.post("/usgromana-gallery/mark-nsfw")
 async def mark_nsfw(request: web.Request) -> web.Response:
     """
     Manually mark an image as NSFW or SFW.
@@ -354,4 +364,11 @@ async def mark_nsfw(request: web.Request) -> web.Response:
     except Exception as e:
         print(f"[Usgromana] Error in mark-nsfw endpoint: {e}")
         return web.json_response({"error": str(e)}, status=500)
+
+ROUTES = [
+    web.get("/usgromana/api/me", api_me),
+    web.post("/usgromana/api/user-env", api_user_env),
+    web.post("/usgromana-gallery/mark-nsfw", mark_nsfw),
+]
+
 # --- END OF FILE routes/user.py ---
@@ -2,13 +2,16 @@
 import os
 import json
 import time
+import logging
 from aiohttp import web
 
 from ..globals import jwt_auth, current_username_var, users_db
 from ..utils import user_env
-from ..utils.sfw_intercept.nsfw_guard import should_block_image_for_current_user
+from ..utils.sfw_intercept.nsfw_guard import should_block_image_for_user_async
 import folder_paths
 
+LOG = logging.getLogger("usgromana.workflows")
+
 # 1. Determine Paths
 COMFY_ROOT = folder_paths.base_path
 
@@ -34,40 +37,13 @@ def get_current_user(request):
 
 def user_is_admin(username: str) -> bool:
     """
-    Returns True if the given username is in the 'admin' group
-    according to users_db. Handles both dict and tuple returns.
+    Returns True if the given username is an admin (admin flag or
+    'admin' group) according to users_db.
     Falls back safely to False on any error.
     """
     try:
-        record = users_db.get_user(username)
-        if not record:
-            print(f"[Usgromana] user_is_admin: no record for {username!r}")
-            return False
-
-        # users_db.get_user(...) might return:
-        # - a dict
-        # - a tuple where one element is the dict (e.g. (user_dict, something))
-        user_obj = None
-
-        if isinstance(record, dict):
-            user_obj = record
-        elif isinstance(record, tuple):
-            # Try to find the dict inside the tuple
-            for item in record:
-                if isinstance(item, dict):
-                    user_obj = item
-                    break
-
-        if not user_obj:
-            print(f"[Usgromana] user_is_admin: unexpected record type for {username!r}: {type(record)} -> {record!r}")
-            return False
-
-        groups = user_obj.get("groups") or user_obj.get("group") or []
-        if isinstance(groups, str):
-            groups = [groups]
-
-        is_admin = any(str(g).lower() == "admin" for g in groups)
-        print(f"[Usgromana] user_is_admin: {username!r} groups={groups!r} is_admin={is_admin}")
+        is_admin = users_db.is_admin(username)
+        print(f"[Usgromana] user_is_admin: {username!r} is_admin={is_admin}")
         return is_admin
 
     except Exception as e:
@@ -321,7 +297,7 @@ async def middleware_dispatch(request):
     if path == "/view" and method == "GET":
         username = get_current_user(request)
         current_username_var.set(username)
-        print(f"[Usgromana] /view requested by user: {username!r}")
+        LOG.debug("[Usgromana] /view requested by user: %r", username)
 
         q = request.rel_url.query
         filename = q.get("filename") or q.get("file") or q.get("name")
@@ -334,7 +310,7 @@ async def middleware_dispatch(request):
 
             if os.path.isfile(img_path):
                 try:
-                    if should_block_image_for_current_user(img_path):
+                    if await should_block_image_for_user_async(img_path, username):
                         # Hard global block for this user
                         print(f"[Usgromana::NSFWGuard] Blocking NSFW image for user={username!r}: {img_path}")
                         return web.Response(status=403, text="NSFW content blocked for this user.")
@@ -374,7 +350,7 @@ async def middleware_dispatch(request):
     if path == "/prompt" and method in ("POST", "PUT"):
         username = get_current_user(request)
         current_username_var.set(username)
-        print(f"[Usgromana] /prompt tagged for user: {username!r}")
+        LOG.debug("[Usgromana] /prompt tagged for user: %r", username)
         # Do not block; let the normal ComfyUI /prompt handler run
         return None
 
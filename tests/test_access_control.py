@@ -0,0 +1,53 @@
+import ast
+import heapq
+import os
+import random
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _load_heap_helpers():
+    """Pull the _heap_* helpers out of utils/access_control.py without importing ComfyUI."""
+    path = os.path.join(REPO_ROOT, "utils", "access_control.py")
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    funcs = [n for n in tree.body if isinstance(n, ast.FunctionDef) and n.name.startswith("_heap_")]
+    namespace = {}
+    exec(compile(ast.Module(body=funcs, type_ignores=[]), path, "exec"), namespace)
+    return namespace
+
+
+def _check(heap, pos):
+    assert all(heap[(k - 1) // 2] <= heap[k] for k in range(1, len(heap)))
+    assert pos == {id(e): i for i, e in enumerate(heap)}
+
+
+def test_heap_remove_keeps_heap_invariant_and_positions():
+    h = _load_heap_helpers()
+    rng = random.Random(0)
+    for _ in range(500):
+        items = [(rng.randint(0, 20), n) for n in range(rng.randint(1, 40))]
+        heap = []
+        pos = {}
+        for item in items:
+            heapq.heappush(heap, item)
+            h["_heap_reindex_path"](heap, pos, len(heap) - 1)
+            _check(heap, pos)
+        expected = sorted(items)
+        while heap:
+            victim = heap[rng.randrange(len(heap))]
+            assert h["_heap_remove"](heap, pos, pos[id(victim)]) is victim
+            expected.remove(victim)
+            _check(heap, pos)
+            assert sorted(heap) == expected
+
+
+def test_heap_remove_at_root_pops_in_order():
+    h = _load_heap_helpers()
+    items = [(n % 7, n) for n in range(50)]
+    heap = list(items)
+    heapq.heapify(heap)
+    pos = {id(e): i for i, e in enumerate(heap)}
+    popped = [h["_heap_remove"](heap, pos, 0) for _ in items]
+    assert popped == sorted(items)
+    assert pos == {}
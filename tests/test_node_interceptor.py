@@ -0,0 +1,90 @@
+import contextlib
+import importlib.util
+import os
+import sys
+import types
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PKG = "usgromana_under_test"
+
+
+class _StubClassifier(torch.nn.Module):
+    """Stand-in classifier: nsfw_prob(pixel_values) -> per-image NSFW probability."""
+
+    def __init__(self, nsfw_prob):
+        super().__init__()
+        self.nsfw_prob = nsfw_prob
+
+    def forward(self, pixel_values):
+        p = self.nsfw_prob(pixel_values)
+        return types.SimpleNamespace(logits=torch.stack([1.0 - p, p], dim=1).log())
+
+
+def _fixed(prob):
+    return lambda x: torch.full((len(x),), prob)
+
+
+def _load_interceptor(monkeypatch, nsfw_prob, size=(8, 8)):
+    """
+    Import utils/sfw_intercept/node_interceptor.py as part of a throwaway
+    package, with ComfyUI's modules and the nsfw_guard entry points replaced.
+    """
+    for name, path in (
+        (PKG, REPO_ROOT),
+        (f"{PKG}.utils", os.path.join(REPO_ROOT, "utils")),
+        (f"{PKG}.utils.sfw_intercept", os.path.join(REPO_ROOT, "utils", "sfw_intercept")),
+    ):
+        pkg = types.ModuleType(name)
+        pkg.__path__ = [path]
+        monkeypatch.setitem(sys.modules, name, pkg)
+
+    model = _StubClassifier(nsfw_prob)
+    mean = torch.zeros(1, 3, 1, 1)
+    std = torch.ones(1, 3, 1, 1)
+    guard = types.ModuleType(f"{PKG}.utils.sfw_intercept.nsfw_guard")
+    guard._classifier_stream = lambda device, *inputs: contextlib.nullcontext()
+    guard._get_nsfw_tensor_classifier = lambda device=None: (model, mean, std, size, 1)
+    guard.is_sfw_enforced_for_current_session = lambda quiet=False: True
+    monkeypatch.setitem(sys.modules, guard.__name__, guard)
+    monkeypatch.setitem(sys.modules, "nodes", types.ModuleType("nodes"))
+    monkeypatch.setitem(sys.modules, "latent_preview", types.ModuleType("latent_preview"))
+
+    name = f"{PKG}.utils.sfw_intercept.node_interceptor"
+    spec = importlib.util.spec_from_file_location(
+        name, os.path.join(REPO_ROOT, "utils", "sfw_intercept", "node_interceptor.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    monkeypatch.setitem(sys.modules, name, module)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.mark.parametrize("nsfw_prob, expected", [(0.1, False), (0.9, True)])
+def test_scan_under_inference_mode(monkeypatch, nsfw_prob, expected):
+    interceptor = _load_interceptor(monkeypatch, _fixed(nsfw_prob))
+
+    # ComfyUI executes nodes under inference_mode, so IMAGE batches are inference tensors
+    with torch.inference_mode():
+        images = torch.rand(2, 16, 16, 3)
+        assert interceptor.scan_tensor_nsfw(images) == [expected, expected]
+        # Second pass over the same tensor is answered from the verdict cache
+        assert interceptor.scan_tensor_nsfw(images) == [expected, expected]
+
+
+def test_lookalike_images_do_not_share_a_verdict(monkeypatch):
+    # Flagged on fine detail only: a checkerboard that any downscaled thumbnail averages away
+    detail = lambda x: (x.flatten(1).std(dim=1) > 0.1).float() * 0.98 + 0.01
+    interceptor = _load_interceptor(monkeypatch, detail, size=(32, 32))
+
+    smooth = torch.full((1, 32, 32, 3), 0.5)
+    checker = (torch.arange(32)[:, None] + torch.arange(32)[None, :]) % 2
+    busy = smooth + (checker.float() - 0.5)[None, :, :, None] * 0.8
+
+    with torch.inference_mode():
+        assert interceptor.scan_tensor_nsfw(smooth.clone()) == [False]
+        assert interceptor.scan_tensor_nsfw(busy) == [True]
+        assert interceptor.scan_tensor_nsfw(torch.cat([smooth, busy])) == [False, True]
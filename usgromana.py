@@ -8,7 +8,7 @@ from .utils.watcher import watcher
 from .utils.bootstrap import ensure_groups_config
 
 # --- Import Routes to register them ---
-# Just importing them is enough because they use the @routes decorator from globals
+# Each module exposes a ROUTES list; __init__.py adds them to globals.routes
 import usgromana.routes.auth
 import usgromana.routes.admin
 import usgromana.routes.user
@@ -1,9 +1,13 @@
 # --- START OF FILE utils/access_control.py ---
 import os
 import json
+import base64
+import hashlib
+import time
 import heapq
-import copy
 import contextvars
+from collections import OrderedDict
+from itertools import islice
 from aiohttp import web
 import folder_paths
 from server import PromptServer
@@ -32,12 +36,157 @@ EXTENSION_BLOCK_MAP = {
     ]
 }
 
+# Public whitelist + core extensions: never permission-checked
+BYPASS_PREFIXES = (
+    "/login", "/register", "/logout", "/usgromana", "/static", "/favicon", "/ws", "/assets",
+    "/extensions/core", "/extensions/ComfyUI-Usgromana", "/extensions/Usgromana",
+)
+
+QUEUE_PREFIXES = ("/prompt", "/api/prompt", "/api/queue", "/queue")
+UPLOAD_PREFIXES = ("/upload", "/api/upload")
+WORKFLOW_PREFIX = "/api/userdata/workflows"  # also covers "/api/userdata/workflows:"
+
+# Checked as configured: only an explicit False denies, admin included
+RAW_PERMISSION_KEYS = ("can_run", "can_upload", "can_access_api")
+
+def _fold_permissions(role: str, perms: dict) -> dict:
+    """
+    Resolve a role's config into {perm_key: allowed}. EXTENSION_BLOCK_MAP keys
+    default to "not guest" and are always allowed for admin. The "*" entry is
+    True when nothing at all is denied (typically admin).
+    """
+    allowed = {k: perms.get(k) is not False for k in RAW_PERMISSION_KEYS}
+    for k in EXTENSION_BLOCK_MAP:
+        v = perms.get(k)
+        if v is None: v = (role != "guest")
+        if role == "admin": v = True
+        allowed[k] = v is not False
+    allowed["*"] = all(allowed.values())
+    return allowed
+
+# Anonymous requests: (role, perms, allowed, username)
+_ANONYMOUS = ("guest", {}, _fold_permissions("guest", {}), None)
+
+_TRIE_END = None  # sentinel key in trie nodes: bundle of perm keys to check
+
+def _build_prefix_trie(block_map: dict) -> dict:
+    """
+    Compile {perm_key: [prefix, ...]} into a lowercase char trie. Each
+    terminal node carries the pre-bundled tuple of every perm key whose
+    prefix ends there or at an ancestor, so a lookup needs no merging.
+    """
+    root = {}
+    for perm_key, prefixes in block_map.items():
+        for prefix in prefixes:
+            node = root
+            for ch in prefix.lower():
+                node = node.setdefault(ch, {})
+            node.setdefault(_TRIE_END, []).append(perm_key)
+
+    stack = [(root, ())]
+    while stack:
+        node, inherited = stack.pop()
+        own = node.get(_TRIE_END)
+        if own is not None:
+            inherited = tuple(dict.fromkeys((*inherited, *own)))
+            node[_TRIE_END] = inherited
+        stack.extend((child, inherited) for ch, child in node.items() if ch is not _TRIE_END)
+    return root
+
+def _match_prefix_trie(trie: dict, path_lower: str) -> tuple:
+    """Walk the trie once over path_lower; return the bundle of the deepest matched prefix."""
+    bundle = ()
+    node = trie
+    for ch in path_lower:
+        node = node.get(ch)
+        if node is None:
+            break
+        bundle = node.get(_TRIE_END, bundle)
+    return bundle
+
+def _unverified_jwt_claims(token: str) -> dict:
+    """Payload segment of a JWT, base64url + JSON decoded. No signature check."""
+    payload_b64 = token.split(".", 2)[1]
+    payload_b64 += "=" * (-len(payload_b64) % 4)
+    return json.loads(base64.urlsafe_b64decode(payload_b64))
+
+def _heap_set(heap: list, pos: dict, i: int, item) -> None:
+    heap[i] = item
+    pos[id(item)] = i
+
+def _heap_sift(heap: list, pos: dict, i: int) -> None:
+    """
+    Move heap[i] up or down to its place, keeping pos ({id(entry): index})
+    in step with every slot it touches.
+    """
+    item = heap[i]
+    start = i
+    # The item may be smaller than its parent...
+    while i > 0:
+        parent = (i - 1) // 2
+        if not item < heap[parent]:
+            break
+        _heap_set(heap, pos, i, heap[parent])
+        i = parent
+    # ...or larger than one of its children
+    if i == start:
+        n = len(heap)
+        while True:
+            child = 2 * i + 1
+            if child >= n:
+                break
+            if child + 1 < n and heap[child + 1] < heap[child]:
+                child += 1
+            if not heap[child] < item:
+                break
+            _heap_set(heap, pos, i, heap[child])
+            i = child
+    _heap_set(heap, pos, i, item)
+
+def _heap_remove(heap: list, pos: dict, i: int):
+    """
+    Remove and return heap[i] in O(log n), keeping the heap invariant and pos.
+    Sifts by hand rather than through heapq's private _siftup/_siftdown.
+    """
+    item = heap[i]
+    last = heap.pop()
+    del pos[id(item)]
+    if i < len(heap):
+        heap[i] = last
+        _heap_sift(heap, pos, i)
+    return item
+
+def _heap_reindex_path(heap: list, pos: dict, i: int) -> None:
+    """Refresh pos for heap[i] and its ancestors: the only slots heapq.heappush moves."""
+    while True:
+        pos[id(heap[i])] = i
+        if i == 0:
+            return
+        i = (i - 1) // 2
+
+# token -> (role, perms, allowed, username) resolutions are reused for a few seconds
+TOKEN_CACHE_TTL = 5.0
+TOKEN_CACHE_MAXSIZE = 10000
+
 class AccessControl:
     def __init__(self, users_db: UsersDB, server: PromptServer, groups_config_file: str):
         self.users_db = users_db
         self.server = server
         self.groups_config_file = groups_config_file
 
+        self._token_cache = {}  # {sha256(token): (expires_at, (role, perms, allowed, username))}
+        self._groups_cfg_cache = (None, {})  # (st_mtime_ns, cfg)
+        self._allowed_cache = {}  # {role: _fold_permissions(role, cfg[role])}, reset with the config
+        self._created_dirs = set()  # per-user input dirs already ensured on disk
+        self._block_trie = _build_prefix_trie(EXTENSION_BLOCK_MAP)
+        # Flat lowercase prefix tuple: one C-level startswith rules out most paths before the trie walk
+        self._block_prefixes_lower = tuple(p.lower() for v in EXTENSION_BLOCK_MAP.values() for p in v)
+
+        # Per-user indices so queue/history calls only touch the caller's items (guarded by the queue mutex)
+        self._user_queue_index = {}    # {user_id: {id(entry): entry}}
+        self._user_history_index = {}  # {user_id: {prompt_id: None}}, insertion-ordered like history
+        self._queue_pos = {}           # {id(entry): index in prompt_queue.queue}
+
         self._current_user = contextvars.ContextVar("user_id", default=None)
         self.__current_user_id = None
         self.__get_output_directory = folder_paths.get_output_directory
@@ -47,13 +196,22 @@ class AccessControl:
         self.__prompt_queue_put = self.__prompt_queue.put
 
     def _load_group_config(self):
-        if not os.path.exists(self.groups_config_file):
+        """Parsed groups config, re-read only when the file's mtime changes."""
+        try:
+            mtime = os.stat(self.groups_config_file).st_mtime_ns
+        except OSError:
             return {}
+        cached_mtime, cached_cfg = self._groups_cfg_cache
+        if mtime == cached_mtime:
+            return cached_cfg
         try:
             with open(self.groups_config_file, 'r') as f:
-                return json.load(f)
+                cfg = json.load(f)
         except Exception:
             return {}
+        self._groups_cfg_cache = (mtime, cfg)
+        self._allowed_cache = {}
+        return cfg
 
     def _get_user_role_and_permissions(self, request):
         token = None
@@ -63,72 +221,79 @@ class AccessControl:
             parts = request.headers.get("Authorization", "").split(" ")
             if len(parts) == 2: token = parts[1]
 
-        if not token: return "guest", {}, None
+        if not token: return _ANONYMOUS
 
+        # Keyed by hash so live bearer tokens are not kept as dict keys
+        key = hashlib.sha256(token.encode("utf-8")).digest()
+        now = time.monotonic()
+        cached = self._token_cache.get(key)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
+        result = self._resolve_token_role(token)
+        if len(self._token_cache) >= TOKEN_CACHE_MAXSIZE:
+            self._token_cache.clear()
+        self._token_cache[key] = (now + TOKEN_CACHE_TTL, result)
+        return result
+
+    def _resolve_token_role(self, token):
         try:
-            import jwt
             # Decode without verification here just to get username for role lookup
             # The actual security check happens in JWTAuth middleware
-            payload = jwt.decode(token, options={"verify_signature": False})
+            payload = _unverified_jwt_claims(token)
             username = payload.get("username")
 
             _, user_rec = self.users_db.get_user(username)
-            if not user_rec: return "guest", {}, None
+            if not user_rec: return _ANONYMOUS
 
-            groups = [g.lower() for g in user_rec.get("groups", [])]
+            groups = user_rec.get("groups", [])
             role = groups[0] if groups else "user"
             cfg = self._load_group_config()
             perms = cfg.get(role, {})
-            return role, perms, username
+            allowed = self._allowed_cache.get(role)
+            if allowed is None:
+                allowed = self._allowed_cache[role] = _fold_permissions(role, perms)
+            return role, perms, allowed, username
         except Exception:
-            return "guest", {}, None
+            return _ANONYMOUS
 
     def create_usgromana_middleware(self):
         @web.middleware
         async def middleware(request: web.Request, handler):
             path = request.path
             
-            # 1. Public Whitelist
-            if (path.startswith(("/login", "/register", "/logout", "/usgromana", "/usgromana-gallery", "/static", "/favicon", "/ws", "/assets")) or path == "/"):
-                return await handler(request)
-            
-            # 2. Core Extensions
-            if path.startswith(("/extensions/core", "/extensions/ComfyUI-Usgromana", "/extensions/Usgromana")):
+            # 1-2. Public Whitelist & Core Extensions ("/usgromana" also covers "/usgromana-gallery")
+            if path == "/" or path.startswith(BYPASS_PREFIXES):
                 return await handler(request)
 
             # 3. Resolve User
-            role, perms, username = self._get_user_role_and_permissions(request)
+            role, perms, allowed, username = self._get_user_role_and_permissions(request)
+            if allowed["*"]:
+                return await handler(request)
 
             # 4. Check Permissions
-            is_queue = path.startswith(("/prompt", "/api/prompt", "/api/queue", "/queue"))
-            is_upload = path.startswith(("/upload", "/api/upload"))
-            is_userdata_workflow = path.startswith(("/api/userdata/workflows", "/api/userdata/workflows:"))
+            is_queue = path.startswith(QUEUE_PREFIXES)
+            is_upload = not is_queue and path.startswith(UPLOAD_PREFIXES)
+            is_userdata_workflow = path.startswith(WORKFLOW_PREFIX)
 
-            if is_queue and perms.get("can_run") is False:
+            if is_queue and not allowed["can_run"]:
                 return web.json_response({"error": "Usgromana: Execution Denied"}, status=403)
 
-            if is_upload and perms.get("can_upload") is False:
+            if is_upload and not allowed["can_upload"]:
                 return web.json_response({"error": "Usgromana: Upload Denied"}, status=403)
 
             if is_userdata_workflow and request.method in ("POST", "PUT", "DELETE", "PATCH"):
-                can_modify = perms.get("can_modify_workflows")
-                if can_modify is None: can_modify = (role != "guest")
-                if role == "admin": can_modify = True
-
-                if not can_modify:
+                if not allowed["can_modify_workflows"]:
                     return web.json_response({"error": "Usgromana: Workflow Denied", "code": "WORKFLOW_DENIED", "role": role}, status=403)
 
-            for perm_key, blocked_paths in EXTENSION_BLOCK_MAP.items():
-                allow = perms.get(perm_key)
-                if allow is None: allow = (role != "guest")
-                if role == "admin": allow = True
-                if allow is False:
-                    for blocked_prefix in blocked_paths:
-                        if path.lower().startswith(blocked_prefix.lower()):
-                            return web.Response(status=403, text="Usgromana: Access Denied")
+            path_lower = path.lower()
+            if role != "admin" and path_lower.startswith(self._block_prefixes_lower):
+                for perm_key in _match_prefix_trie(self._block_trie, path_lower):
+                    if not allowed[perm_key]:
+                        return web.Response(status=403, text="Usgromana: Access Denied")
 
             if not is_queue and not is_upload and path.startswith("/api/"):
-                if perms.get("can_access_api") is False:
+                if not allowed["can_access_api"]:
                     return web.json_response({"error": "Usgromana: API Denied"}, status=403)
 
             return await handler(request)
@@ -141,7 +306,8 @@ class AccessControl:
         if set_fallback: self.__current_user_id = user_id
     
     def get_current_user_id(self):
-        return self._current_user.get() or self.__current_user_id
+        uid = self._current_user.get()
+        return uid if uid is not None else self.__current_user_id
 
     def get_user_output_directory(self):
         return os.path.join(self.__get_output_directory(), self.get_current_user_id() or "public")
@@ -151,20 +317,26 @@ class AccessControl:
 
     def get_user_input_directory(self):
         directory = os.path.join(self.__get_input_directory(), self.get_current_user_id() or "public")
-        os.makedirs(directory, exist_ok=True)
+        if directory not in self._created_dirs:
+            os.makedirs(directory, exist_ok=True)
+            self._created_dirs.add(directory)
         return directory
 
     def add_user_specific_folder_paths(self, json_data):
+        # Iterative walk: prompt graphs can be deep, and the user id is read once
         user_id = self.get_current_user_id() or "public"
-        if isinstance(json_data, dict):
-            for k, v in json_data.items():
-                if k == "filename_prefix":
-                    json_data[k] = f"{user_id}/{v}"
-                else:
-                    self.add_user_specific_folder_paths(v)
-        elif isinstance(json_data, list):
-            for item in json_data:
-                self.add_user_specific_folder_paths(item)
+        stack = [json_data]
+        while stack:
+            node = stack.pop()
+            t = type(node)
+            if t is dict:
+                for k, v in node.items():
+                    if k == "filename_prefix":
+                        node[k] = f"{user_id}/{v}"
+                    else:
+                        stack.append(v)
+            elif t is list:
+                stack.extend(node)
         return json_data
 
     def patch_folder_paths(self):
@@ -174,15 +346,16 @@ class AccessControl:
 
     # --- MISSING METHOD RESTORED HERE ---
     def create_folder_access_control_middleware(self):
-        folder_paths_check = (
+        self._folder_roots = tuple(map(os.path.normpath, (
             self.__get_output_directory(),
             self.__get_temp_directory(),
             self.__get_input_directory(),
-        )
+        )))
+        folder_roots = self._folder_roots
 
         @web.middleware
         async def middleware(request: web.Request, handler):
-            if not request.path.startswith(folder_paths_check):
+            if not request.rel_url.path.startswith(folder_roots):
                 return await handler(request)
             # Future expansion: Check permissions for specific file access here
             return await handler(request)
@@ -192,6 +365,11 @@ class AccessControl:
     # --- Queue Patching ---
 
     def patch_prompt_queue(self):
+        # O(1) oldest-first eviction in task_done
+        if not isinstance(self.__prompt_queue.history, OrderedDict):
+            self.__prompt_queue.history = OrderedDict(self.__prompt_queue.history)
+        with self.__prompt_queue.mutex:
+            self._queue_pos = {id(e): i for i, e in enumerate(self.__prompt_queue.queue)}
         self.__prompt_queue.put = self.user_queue_put
         self.__prompt_queue.get = self.user_queue_get
         self.__prompt_queue.task_done = self.user_queue_task_done
@@ -199,31 +377,42 @@ class AccessControl:
         self.__prompt_queue.wipe_queue = self.user_queue_wipe_queue
         self.__prompt_queue.delete_queue_item = self.user_queue_delete_queue_item
         self.__prompt_queue.get_history = self.user_queue_get_history
+        self.__prompt_queue.delete_history_item = self.user_queue_delete_history_item
         self.__prompt_queue.wipe_history = self.user_queue_wipe_history
 
+    @staticmethod
+    def _entry_user_id(entry):
+        return entry[-1].get("user_id") if isinstance(entry, tuple) and isinstance(entry[-1], dict) else None
+
+    @staticmethod
+    def _index_discard(index, user_id, key):
+        entries = index.get(user_id)
+        if entries is not None:
+            entries.pop(key, None)
+            if not entries: del index[user_id]
+
     def user_queue_put(self, item):
         current_user_id = self.get_current_user_id()
         _, user_rec = self.users_db.get_user(current_user_id)
 
         if user_rec:
-            if os.path.exists(self.groups_config_file):
-                try:
-                    with open(self.groups_config_file, 'r') as f:
-                        cfg = json.load(f)
-                    groups = user_rec.get("groups", ["user"])
-                    role = groups[0] if groups else "user"
-                    perms = cfg.get(role, {})
-                    if perms.get("can_run") is False:
-                        print(f"[AccessControl] Blocked execution for {current_user_id}")
-                        return
-                except Exception:
-                    pass
+            cfg = self._load_group_config()
+            groups = user_rec.get("groups", ["user"])
+            role = groups[0] if groups else "user"
+            perms = cfg.get(role, {})
+            if perms.get("can_run") is False:
+                print(f"[AccessControl] Blocked execution for {current_user_id}")
+                return
 
         if isinstance(item, tuple):
             new_item = (*item, {"user_id": current_user_id})
         else:
             new_item = (item, {"user_id": current_user_id})
-        self.__prompt_queue_put(new_item)
+        with self.__prompt_queue.mutex:
+            self.__prompt_queue_put(new_item)
+            queue = self.__prompt_queue.queue
+            _heap_reindex_path(queue, self._queue_pos, len(queue) - 1)
+            self._user_queue_index.setdefault(current_user_id, {})[id(new_item)] = new_item
 
     def user_queue_get(self, timeout=None):
         with self.__prompt_queue.not_empty:
@@ -231,20 +420,24 @@ class AccessControl:
                 self.__prompt_queue.not_empty.wait(timeout=timeout)
                 if timeout and not self.__prompt_queue.queue:
                     return None
-            entry = heapq.heappop(self.__prompt_queue.queue)
+            entry = _heap_remove(self.__prompt_queue.queue, self._queue_pos, 0)
+            self._index_discard(self._user_queue_index, self._entry_user_id(entry), id(entry))
             task_id = self.__prompt_queue.task_counter
             self.__prompt_queue.currently_running[task_id] = entry
             self.__prompt_queue.task_counter += 1
-            self.server.queue_updated()
-            return (entry, task_id)
+        # Broadcast after releasing the lock so producers aren't stalled on it
+        self.server.queue_updated()
+        return (entry, task_id)
 
     def user_queue_task_done(self, item_id, history_result, **kwargs):
         with self.__prompt_queue.mutex:
             item = self.__prompt_queue.currently_running.pop(item_id)
             while len(self.__prompt_queue.history) > MAXIMUM_HISTORY_SIZE:
-                self.__prompt_queue.history.pop(next(iter(self.__prompt_queue.history)))
+                old_id, old = self.__prompt_queue.history.popitem(last=False)
+                self._index_discard(self._user_history_index, old.get("user_id"), old_id)
             prompt_tuple = item[:-1] if isinstance(item[-1], dict) else item
             meta = item[-1] if isinstance(item[-1], dict) else {}
+            self._user_history_index.setdefault(meta.get("user_id"), {})[prompt_tuple[1]] = None
             self.__prompt_queue.history[prompt_tuple[1]] = {
                 "prompt": prompt_tuple,
                 "outputs": {},
@@ -271,19 +464,19 @@ class AccessControl:
                 meta = item[-1] if isinstance(item[-1], dict) else None
                 if not meta or meta.get("user_id") != current_user: continue
                 running.append(unwrap(item))
-            for item in self.__prompt_queue.queue:
-                meta = item[-1] if isinstance(item[-1], dict) else None
-                if not meta or meta.get("user_id") != current_user: continue
+            for item in self._user_queue_index.get(current_user, {}).values():
                 pending.append(unwrap(item))
-            return (running, copy.deepcopy(pending))
+            # unwrap() already returns fresh tuples; callers only serialize them
+            return (running, pending)
 
     def user_queue_wipe_queue(self):
         with self.__prompt_queue.mutex:
             current_user = self.get_current_user_id()
-            self.__prompt_queue.queue = [
-                i for i in self.__prompt_queue.queue
-                if not (isinstance(i[-1], dict) and i[-1].get("user_id") == current_user)
-            ]
+            mine = self._user_queue_index.pop(current_user, None)
+            if mine:
+                self.__prompt_queue.queue = [i for i in self.__prompt_queue.queue if id(i) not in mine]
+                heapq.heapify(self.__prompt_queue.queue)
+                self._queue_pos = {id(e): i for i, e in enumerate(self.__prompt_queue.queue)}
             self.server.queue_updated()
 
     def user_queue_delete_queue_item(self, func):
@@ -291,39 +484,49 @@ class AccessControl:
             if isinstance(entry, tuple) and isinstance(entry[-1], dict): return entry[:-1]
             return entry
 
+        current_user = self.get_current_user_id()
         with self.__prompt_queue.mutex:
-            for i, item in enumerate(self.__prompt_queue.queue):
-                meta = item[-1] if isinstance(item[-1], dict) else None
-                if meta and meta.get("user_id") == self.get_current_user_id() and func(unwrap(item)):
-                    self.__prompt_queue.queue.pop(i)
-                    heapq.heapify(self.__prompt_queue.queue)
+            queue = self.__prompt_queue.queue
+            for item in list(self._user_queue_index.get(current_user, {}).values()):
+                if func(unwrap(item)):
+                    i = self._queue_pos.get(id(item))
+                    self._index_discard(self._user_queue_index, current_user, id(item))
+                    if i is None or queue[i] is not item:
+                        # Stale index entry (already popped elsewhere); keep looking
+                        continue
+                    _heap_remove(queue, self._queue_pos, i)
                     self.server.queue_updated()
                     return True
         return False
 
     def user_queue_get_history(self, prompt_id=None, max_items=None, offset=-1):
+        user = self.get_current_user_id()
         with self.__prompt_queue.mutex:
-            user = self.get_current_user_id()
-            filtered = {
-                k: v for k, v in self.__prompt_queue.history.items()
-                if v.get("user_id") == user
-            }
+            history = self.__prompt_queue.history
             if prompt_id:
-                return {prompt_id: filtered.get(prompt_id)} if prompt_id in filtered else {}
-            keys = list(filtered.keys())
-            if offset < 0:
-                offset = max(0, len(keys) - max_items) if max_items else 0
-            result = {}
-            for k in keys[offset:]:
-                result[k] = filtered[k]
-                if max_items and len(result) >= max_items:
-                    break
-            return result
+                v = history.get(prompt_id)
+                return {prompt_id: v} if v is not None and v.get("user_id") == user else {}
+            # Index keys whose entry was removed behind our back are skipped
+            index = self._user_history_index.get(user, {})
+            if offset < 0 and max_items:
+                # Newest max_items: scan from the end and stop early
+                newest = islice(((k, history[k]) for k in reversed(index) if k in history), max_items)
+                return dict(reversed(list(newest)))
+            mine = ((k, history[k]) for k in index if k in history)
+            start = max(offset, 0)
+            return dict(islice(mine, start, start + max_items if max_items else None))
+
+    def user_queue_delete_history_item(self, id_to_delete):
+        with self.__prompt_queue.mutex:
+            entry = self.__prompt_queue.history.pop(id_to_delete, None)
+            if entry is not None:
+                self._index_discard(self._user_history_index, entry.get("user_id"), id_to_delete)
 
     def user_queue_wipe_history(self):
         with self.__prompt_queue.mutex:
             u = self.get_current_user_id()
-            self.__prompt_queue.history = {
-                k: v for k, v in self.__prompt_queue.history.items()
-                if v.get("user_id") != u
-            }
+            history = self.__prompt_queue.history
+            for k in self._user_history_index.pop(u, ()):
+                v = history.get(k)
+                if v is not None and v.get("user_id") == u:
+                    del history[k]
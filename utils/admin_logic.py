@@ -1,18 +1,19 @@
 from ..constants import USERS_FILE
 from .json_utils import load_json_file, save_json_file
+from ..globals import users_db
 
 def patch_user_group(username, group_list, is_admin_bool, sfw_check=None):
     raw = load_json_file(USERS_FILE, {})
     users_data = raw.get("users", raw) if isinstance(raw, dict) else raw
 
-    target_rec = None
-    target_key = None
+    # Single normalized view over either storage shape (dict keyed by id, or list).
+    # Records are patched in place, so `raw` already reflects the change on save.
+    records = users_data.values() if isinstance(users_data, dict) else users_data
 
-    iterator = users_data.items() if isinstance(users_data, dict) else enumerate(users_data)
-    for k, u in iterator:
+    target_rec = None
+    for u in records:
         if u.get("username") == username or u.get("user") == username:
             target_rec = u
-            target_key = k
             break
 
     if not target_rec:
@@ -26,18 +27,9 @@ def patch_user_group(username, group_list, is_admin_bool, sfw_check=None):
     if sfw_check is not None:
         target_rec["sfw_check"] = bool(sfw_check)
 
-    # Write back into the same structure
-    if isinstance(users_data, list):
-        users_data[target_key] = target_rec
-    else:
-        users_data[target_key] = target_rec
-
-    if isinstance(raw, dict) and "users" in raw:
-        raw["users"] = users_data
-    else:
-        raw = users_data
-
     save_json_file(USERS_FILE, raw)
+    # Pick up the edit now so revision-keyed caches (e.g. Reactor sfw_check) drop it immediately
+    users_db.load_users()
     return True
 
 
@@ -52,11 +44,12 @@ def delete_user_record(username):
     iterable = enumerate(users_data) if isinstance(users_data, list) else users_data.items()
     for idx, u in iterable:
         uname = u.get("username") or u.get("user")
-        if u.get("admin", False) or "admin" in u.get("groups", []):
+        u_is_admin = users_db.is_admin(u)
+        if u_is_admin:
             admins_remaining += 1
         if uname == username:
             target_index = idx
-            is_target_admin = u.get("admin", False) or "admin" in u.get("groups", [])
+            is_target_admin = u_is_admin
 
     if target_index is None:
         return False
@@ -77,4 +70,6 @@ def delete_user_record(username):
         raw = users_data
 
     save_json_file(USERS_FILE, raw)
+    # Pick up the deletion now so cached flags (has_any_users, admin user) follow it
+    users_db.load_users()
     return True
@@ -43,7 +43,7 @@ def ensure_guest_user():
     try:
         guest_id, guest_rec = users_db.get_user("guest")
     except Exception as e:
-        logger.error(f"[Usgromana] Error checking guest user: {e}")
+        logger.error("[Usgromana] Error checking guest user: %s", e)
         return
 
     if guest_id is not None:
@@ -57,4 +57,4 @@ def ensure_guest_user():
         patch_user_group("guest", ["guest"], False)
         logger.info("[Usgromana] Created default 'guest' user")
     except Exception as e:
-        logger.error(f"[Usgromana] Error creating guest user: {e}")
\ No newline at end of file
+        logger.error("[Usgromana] Error creating guest user: %s", e)
\ No newline at end of file
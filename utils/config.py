@@ -1,7 +1,8 @@
 import os
 import warnings
-import uuid
+import secrets
 import json
+from dataclasses import dataclass
 from typing import Dict, Any
 from pathlib import Path
 
@@ -31,7 +32,7 @@ if not SECRET_KEY:
         "The SECRET_KEY environment variable is not set. A random key will be used for this session. "
         "This will cause all users to log out on server restart."
     )
-    SECRET_KEY = "".join([str(uuid.uuid4().hex) for _ in range(128)])
+    SECRET_KEY = secrets.token_hex(64)
 
 MATCH_HEADERS = {"X-Forwarded-Proto": "https"}
 
@@ -39,12 +40,43 @@ TOKEN_ALGORITHM = "HS256"
 TOKEN_EXPIRE_MINUTES = 60 * config.get("access_token_expiration_hours", 12)
 MAX_TOKEN_EXPIRE_MINUTES = 60 * config.get("max_access_token_expiration_hours", 8760)
 
-USERS_FILE = os.path.join(EXT_PATH, config.get("users_db", "users_db.json"))
-LOG_FILE = os.path.join(EXT_PATH, config.get("log", "Usgromana.log"))
+
+@dataclass(frozen=True, slots=True)
+class _Paths:
+    """Config-derived file and web paths, resolved once at import."""
+    users_file: str
+    log_file: str
+    whitelist: str
+    blacklist: str
+    web_dir: str
+    css_dir: str
+    js_dir: str
+    assets_dir: str
+
+
+def _resolve_paths(cfg: Dict[str, Any]) -> _Paths:
+    ext = Path(EXT_PATH)
+    web = ext / "usgromana-web"
+    return _Paths(
+        users_file=str(ext / cfg.get("users_db", "users_db.json")),
+        log_file=str(ext / cfg.get("log", "Usgromana.log")),
+        whitelist=str(ext / cfg.get("whitelist", "whitelist.txt")),
+        blacklist=str(ext / cfg.get("blacklist", "blacklist.txt")),
+        web_dir=str(web),
+        css_dir=str(web / "css"),
+        js_dir=str(web / "js"),
+        assets_dir=str(web / "assets"),
+    )
+
+
+CFG = _resolve_paths(config)
+
+USERS_FILE = CFG.users_file
+LOG_FILE = CFG.log_file
 LOG_LEVELS = config.get("log_levels", ["INFO"])
 
-WHITELIST = os.path.join(EXT_PATH, config.get("whitelist", "whitelist.txt"))
-BLACKLIST = os.path.join(EXT_PATH, config.get("blacklist", "blacklist.txt"))
+WHITELIST = CFG.whitelist
+BLACKLIST = CFG.blacklist
 
 BLACKLIST_AFTER_ATTEMPTS = config.get("blacklist_after_attempts")
 
@@ -55,8 +87,8 @@ SEPERATE_USERS = config.get("seperate_users", False)
 
 MANAGER_ADMIN_ONLY = config.get("manager_admin_only", False)
 
-WEB_DIR = os.path.join(EXT_PATH, "usgromana-web")
+WEB_DIR = CFG.web_dir
 HTML_DIR = WEB_DIR
-CSS_DIR = os.path.join(WEB_DIR, "css")
-JS_DIR = os.path.join(WEB_DIR, "js")
-ASSETS_DIR = os.path.join(WEB_DIR, "assets")
+CSS_DIR = CFG.css_dir
+JS_DIR = CFG.js_dir
+ASSETS_DIR = CFG.assets_dir
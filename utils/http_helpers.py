@@ -0,0 +1,21 @@
+import json
+from functools import lru_cache
+
+from aiohttp import web
+
+
+def prefers_html(request: web.Request) -> bool:
+    """True if the Accept header lists text/html as a media type. Memoized on the request."""
+    cached = request.get("_prefers_html")
+    if cached is not None:
+        return cached
+    accept = request.headers.get("Accept", "")
+    result = any(part.split(";", 1)[0].strip() == "text/html" for part in accept.split(","))
+    request["_prefers_html"] = result
+    return result
+
+
+@lru_cache(maxsize=32)
+def json_error_body(message: str) -> bytes:
+    """Encoded {"error": message} body; the handful of fixed error messages are built once."""
+    return json.dumps({"error": message}).encode("utf-8")
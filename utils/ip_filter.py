@@ -1,13 +1,18 @@
 import os
-import hashlib
 import ipaddress
 
 from aiohttp import web
 from pathlib import Path
 
+from .http_helpers import prefers_html, json_error_body
+
 
 def get_ip(request: web.Request) -> str:
-    """Extract IP address from request headers or remote address."""
+    """Extract IP address from request headers or remote address. Memoized on the request."""
+    cached = request.get("_client_ip")
+    if cached is not None:
+        return cached
+
     forwarded = request.headers.get("X-Forwarded-For")
     if forwarded:
         ip = forwarded.split(",")[0].strip()
@@ -23,71 +28,120 @@ def get_ip(request: web.Request) -> str:
     except ValueError:
         ip = ""
 
+    request["_client_ip"] = ip
     return ip
 
 
+DECISION_CACHE_MAXSIZE = 10000
+
+
 class IPFilter:
     def __init__(self, whitelist_file: str | Path, blacklist_file: str | Path):
         self.whitelist_file = whitelist_file
         self.blacklist_file = blacklist_file
 
-        self._whitelist_hash = None
-        self._blacklist_hash = None
+        # (st_mtime_ns, st_size) of each list file when last parsed; None = missing, False = never parsed
+        self._whitelist_stat = False
+        self._blacklist_stat = False
+
+        # Hashed sets of single IPs and CIDR networks, for O(1) exact-IP checks
+        self.whitelist = set()
+        self.blacklist = set()
+
+        # The CIDR networks from each set, the only entries that need a containment scan
+        self._whitelist_nets = ()
+        self._blacklist_nets = ()
+
+        # Single IPs packed to ints, per IP version: int hashing is far cheaper than IPv*Address.__hash__
+        self._whitelist_ints = {4: set(), 6: set()}
+        self._blacklist_ints = {4: set(), 6: set()}
+
+        # Whether each list file (keyed by list attribute) ends in "\n"; lets appends skip re-reading it
+        self._ends_with_newline = {}
 
-        self.whitelist = []
-        self.blacklist = []
+        # {ip: allowed} verdicts for clients already seen; reset whenever either list changes
+        self._decisions = {}
+
+        # Pre-stringified copies of the lists above, for the admin API
+        self._whitelist_str = []
+        self._blacklist_str = []
 
         self.load_filter_list()
 
     @staticmethod
-    def calculate_file_hash(filter_file) -> str:
-        """Calculate the SHA256 hash of the filter IP list file."""
-        if os.path.exists(filter_file):
-            with open(filter_file, "rb") as f:
-                file_data = f.read()
-                return hashlib.sha256(file_data).hexdigest()
-        return ""
-
-    def load_filter_list(self) -> tuple[list, list]:
+    def file_signature(filter_file) -> tuple[int, int] | None:
+        """Cheap change marker for a filter IP list file: (mtime_ns, size), or None if missing."""
+        try:
+            st = os.stat(filter_file)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def load_filter_list(self) -> tuple[set, set]:
         """Load whitelist and blacklist IP lists from files. Supports both single IPs and CIDR ranges."""
 
         def load_ip_list(
-            file_path: str | Path, current_hash: str, hash_attribute: str, list_attribute: str
-        ) -> list:
-            new_hash = self.calculate_file_hash(file_path)
-            if new_hash != current_hash:
+            file_path: str | Path, current_stat, stat_attribute: str, list_attribute: str, str_attribute: str,
+            nets_attribute: str, ints_attribute: str
+        ) -> set:
+            new_stat = self.file_signature(file_path)
+            if new_stat != current_stat:
                 ip_list = []
-                if os.path.exists(file_path):
-                    with open(file_path, "r") as f:
-                        for line in f:
-                            ip = line.strip()
-                            if ip and not ip.startswith("#"):  # Skip comments
-                                try:
-                                    # Try as single IP first
-                                    ip_list.append(ipaddress.ip_address(ip))
-                                except ValueError:
-                                    try:
-                                        # Try as CIDR network
-                                        ip_list.append(ipaddress.ip_network(ip, strict=False))
-                                    except ValueError:
-                                        # Invalid IP format, skip
-                                        continue
-                setattr(self, hash_attribute, new_hash)
-                setattr(self, list_attribute, ip_list)
-                return ip_list
+                data = b""
+                if new_stat is not None:
+                    # One read, then a tight loop with locally bound callables
+                    data = Path(file_path).read_bytes()
+                    append = ip_list.append
+                    ip_address = ipaddress.ip_address
+                    ip_network = ipaddress.ip_network
+                    for raw in data.splitlines():
+                        raw = raw.strip()
+                        if not raw or raw.startswith(b"#"):  # Skip comments
+                            continue
+                        ip = raw.decode("utf-8", "ignore")
+                        try:
+                            # Try as single IP first
+                            append(ip_address(ip))
+                        except ValueError:
+                            try:
+                                # Try as CIDR network
+                                append(ip_network(ip, strict=False))
+                            except ValueError:
+                                # Invalid IP format, skip
+                                continue
+                setattr(self, stat_attribute, new_stat)
+                self._ends_with_newline[list_attribute] = not data or data.endswith(b"\n")
+                self._decisions = {}
+                setattr(self, list_attribute, set(ip_list))
+                setattr(self, str_attribute, [str(ip) for ip in ip_list])
+                nets = tuple(ip for ip in ip_list if isinstance(ip, (ipaddress.IPv4Network, ipaddress.IPv6Network)))
+                ints = {4: set(), 6: set()}
+                for ip in ip_list:
+                    if not isinstance(ip, (ipaddress.IPv4Network, ipaddress.IPv6Network)):
+                        ints[ip.version].add(int(ip))
+                setattr(self, nets_attribute, nets)
+                setattr(self, ints_attribute, ints)
+                return getattr(self, list_attribute)
             else:
-                # Hash unchanged, return cached list
+                # File unchanged, return cached list
                 return getattr(self, list_attribute)
 
         self.whitelist = load_ip_list(
-            self.whitelist_file, self._whitelist_hash, "_whitelist_hash", "whitelist"
+            self.whitelist_file, self._whitelist_stat, "_whitelist_stat", "whitelist", "_whitelist_str",
+            "_whitelist_nets", "_whitelist_ints"
         )
         self.blacklist = load_ip_list(
-            self.blacklist_file, self._blacklist_hash, "_blacklist_hash", "blacklist"
+            self.blacklist_file, self._blacklist_stat, "_blacklist_stat", "blacklist", "_blacklist_str",
+            "_blacklist_nets", "_blacklist_ints"
         )
 
         return self.whitelist, self.blacklist
 
+    def load_filter_list_str(self) -> tuple[list[str], list[str]]:
+        """Like load_filter_list, but returns the cached string form of every entry."""
+        self.load_filter_list()
+        return self._whitelist_str, self._blacklist_str
+
     def is_allowed(self, ip: str) -> bool:
         """
         Checks if the given IP address is allowed based on the whitelist and blacklist.
@@ -98,37 +152,45 @@ class IPFilter:
         """
         self.load_filter_list()
 
+        # Repeat clients skip address parsing and the network scan entirely
+        allowed = self._decisions.get(ip)
+        if allowed is None:
+            if len(self._decisions) >= DECISION_CACHE_MAXSIZE:
+                self._decisions = {}
+            allowed = self._decisions[ip] = self._evaluate(ip)
+        return allowed
+
+    def _evaluate(self, ip: str) -> bool:
+        """Uncached is_allowed verdict against the currently loaded lists."""
         try:
             ip_addr = ipaddress.ip_address(ip)
         except ValueError:
             return False
 
+        packed, version = int(ip_addr), ip_addr.version
+
         # Check whitelist (if not empty, IP must be whitelisted)
         if self.whitelist:
-            for entry in self.whitelist:
-                if isinstance(entry, (ipaddress.IPv4Network, ipaddress.IPv6Network)):
-                    # CIDR range check
-                    if ip_addr in entry:
-                        return True
-                else:
-                    # Single IP check
-                    if ip_addr == entry:
-                        return True
-            return False
+            # Single IP check, then CIDR range check
+            return packed in self._whitelist_ints[version] or any(ip_addr in net for net in self._whitelist_nets)
 
         # Check blacklist (if whitelist is empty)
-        for entry in self.blacklist:
-            if isinstance(entry, (ipaddress.IPv4Network, ipaddress.IPv6Network)):
-                # CIDR range check
-                if ip_addr in entry:
-                    return False
-            else:
-                # Single IP check
-                if ip_addr == entry:
-                    return False
+        if packed in self._blacklist_ints[version] or any(ip_addr in net for net in self._blacklist_nets):
+            return False
 
         return True
 
+    def is_whitelisted(self, ip: str) -> bool:
+        """True if ip is on the whitelist (single IP or CIDR range). Stat-only refresh of the lists."""
+        self.load_filter_list()
+        try:
+            ip_addr = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        return int(ip_addr) in self._whitelist_ints[ip_addr.version] or any(
+            ip_addr in net for net in self._whitelist_nets
+        )
+
     def add_to_blacklist(self, ip: str) -> None:
         """Add a given IP to the blacklist file."""
         try:
@@ -136,34 +198,31 @@ class IPFilter:
         except ValueError:
             return
         
+        # Stat-only refresh: picks up external edits to the file before appending
+        self.load_filter_list()
+
         # Check if already in blacklist
         ip_str = str(ip_obj)
-        for entry in self.blacklist:
-            if str(entry) == ip_str:
-                return  # Already in blacklist
+        if ip_obj in self.blacklist:
+            return  # Already in blacklist
         
-        # Add to in-memory list
-        self.blacklist.append(ip_obj)
+        # Add to in-memory set
+        self.blacklist.add(ip_obj)
+        self._blacklist_ints[ip_obj.version].add(int(ip_obj))
+        self._decisions = {}
+        self._blacklist_str.append(ip_str)
         
         # Append to file
         try:
-            # Check if file exists and has content
-            file_exists = os.path.exists(self.blacklist_file)
-            needs_newline = False
-            
-            if file_exists:
-                with open(self.blacklist_file, "r") as f:
-                    content = f.read()
-                    if content and not content.endswith("\n"):
-                        needs_newline = True
-            
+            # Trailing-newline state is tracked at load time, so no read-back is needed
+            needs_newline = not self._ends_with_newline.get("blacklist", True)
+
             with open(self.blacklist_file, "a") as file:
-                if needs_newline:
-                    file.write("\n")
-                file.write(ip_str + "\n")
+                file.write(("\n" if needs_newline else "") + ip_str + "\n")
+            self._ends_with_newline["blacklist"] = True
             
-            # Update hash after writing
-            self._blacklist_hash = self.calculate_file_hash(self.blacklist_file)
+            # Update signature after writing
+            self._blacklist_stat = self.file_signature(self.blacklist_file)
         except Exception as e:
             # Log error but don't fail - in-memory list is updated
             print(f"[Usgromana] Warning: Failed to write IP to blacklist file: {e}")
@@ -187,10 +246,9 @@ class IPFilter:
             request: web.Request, message: str
         ) -> web.Response:
             """Handle denied access cases."""
-            accept_header = request.headers.get("Accept", "")
-            if "text/html" in accept_header:
+            if prefers_html(request):
                 return web.HTTPForbidden(reason=message)
             else:
-                return web.json_response({"error": message}, status=403)
+                return web.Response(body=json_error_body(message), status=403, content_type="application/json", charset="utf-8")
 
         return ip_filter_middleware
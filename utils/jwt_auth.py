@@ -1,10 +1,17 @@
 import jwt
+import time
+import hashlib
 from aiohttp import web
 from datetime import datetime, timedelta, timezone
 
 from .users_db import UsersDB
 from .access_control import AccessControl
 from .logger import Logger
+from .http_helpers import prefers_html, json_error_body
+
+# Verified token payloads are reused for a few seconds (never past their own exp)
+DECODE_CACHE_TTL = 5.0
+DECODE_CACHE_MAXSIZE = 10000
 
 
 class JWTAuth:
@@ -26,6 +33,8 @@ class JWTAuth:
 
         self.__secret_key = secret_key
 
+        self._decode_cache = {}  # {sha256(token): (expires_at, payload)}
+
     @staticmethod
     def get_token_from_request(request: web.Request) -> str:
         """Extract token from request headers or cookies."""
@@ -36,33 +45,84 @@ class JWTAuth:
 
     def create_access_token(self, data: dict, expire_minutes=None) -> str:
         """Create a JWT access token."""
-        to_encode = data.copy()
-        if not expire_minutes:
-            expire_minutes = self.expire_minutes
-        expire = datetime.now(timezone.utc) + timedelta(minutes=expire_minutes)
-        to_encode.update({"exp": expire})
-        return jwt.encode(to_encode, self.__secret_key, algorithm=self.algorithm)
+        expire = datetime.now(timezone.utc) + timedelta(minutes=expire_minutes or self.expire_minutes)
+        return jwt.encode({**data, "exp": expire}, self.__secret_key, algorithm=self.algorithm)
 
     def decode_access_token(self, token: str) -> dict:
-        """Decode a JWT access token."""
-        return jwt.decode(token, self.__secret_key, algorithms=[self.algorithm])
+        """Decode a JWT access token. Successful decodes are cached briefly, keyed by token hash."""
+        key = hashlib.sha256(token.encode("utf-8")).digest()
+        now = time.monotonic()
+        cached = self._decode_cache.get(key)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
+        payload = jwt.decode(token, self.__secret_key, algorithms=[self.algorithm])
+
+        ttl = DECODE_CACHE_TTL
+        exp = payload.get("exp")
+        if isinstance(exp, (int, float)):
+            ttl = min(ttl, exp - time.time())
+        if ttl > 0:
+            if len(self._decode_cache) >= DECODE_CACHE_MAXSIZE:
+                self._decode_cache.clear()
+            self._decode_cache[key] = (now + ttl, payload)
+        return payload
+
+    def build_identity(self, username: str, user_rec: dict) -> dict:
+        """Identity dict attached to validated requests as request["_jwt_user"]."""
+        return {
+            "username": username,
+            "groups": user_rec.get("groups", []),
+            "is_admin": self.users_db.is_admin(user_rec),
+        }
+
+    def identify_request(self, request: web.Request) -> None:
+        """
+        Best-effort identity for public paths: if a valid token is present,
+        attach request["_jwt_user"]. Never rejects the request.
+        """
+        token = self.get_token_from_request(request)
+        if not token:
+            return
+        try:
+            user = self.decode_access_token(token)
+            username = user.get("username")
+            user_id, user_rec = self.users_db.get_user(username)
+            if user_id is not None and user_id == user.get("id"):
+                request["_jwt_user"] = self.build_identity(username, user_rec)
+        except Exception:
+            pass
 
     def create_jwt_middleware(
         self,
         public: tuple = (),
         public_prefixes: tuple = (),
         public_suffixes: tuple = (),
+        identify_prefixes: tuple = (),
     ) -> web.middleware:
-        """Create middleware for JWT authentication."""
+        """
+        Create middleware for JWT authentication.
+
+        Paths under `identify_prefixes` stay public, but get request["_jwt_user"]
+        attached when the caller has a valid token.
+        """
+        # Exact matches hash once; prefixes/suffixes stay C-level tuple startswith/endswith
+        public = frozenset(public)
+        public_prefixes = tuple(public_prefixes)
+        public_suffixes = tuple(public_suffixes)
+        identify_prefixes = tuple(identify_prefixes)
 
         @web.middleware
         async def jwt_middleware(request: web.Request, handler) -> web.Response:
             """Middleware to handle JWT authentication."""
+            path = request.path
             if (
-                request.path in public
-                or request.path.startswith(public_prefixes)
-                or request.path.endswith(public_suffixes)
+                path in public
+                or path.startswith(public_prefixes)
+                or (public_suffixes and path.endswith(public_suffixes))
             ):
+                if identify_prefixes and path.startswith(identify_prefixes):
+                    self.identify_request(request)
                 return await handler(request)
 
             token = self.get_token_from_request(request)
@@ -71,13 +131,13 @@ class JWTAuth:
                 return await handle_unauthorized_access(request, "/login")
 
             try:
-                self.logger.info(f"[JWT DEBUG] Decoding token for {request.path}, key type={type(self.__secret_key).__name__}, key len={len(self.__secret_key)}")
+                self.logger.info("[JWT DEBUG] Decoding token for %s, key type=%s, key len=%d", path, type(self.__secret_key).__name__, len(self.__secret_key))
                 user = self.decode_access_token(token)
                 user_id = user.get("id")
                 username = user.get("username")
-                self.logger.info(f"[JWT DEBUG] Token decoded OK: id={user_id}, username={username}")
+                self.logger.info("[JWT DEBUG] Token decoded OK: id=%s, username=%s", user_id, username)
                 db_result = self.users_db.get_user(username)
-                self.logger.info(f"[JWT DEBUG] DB lookup for '{username}': id={db_result[0]}, match={user_id == db_result[0]}")
+                self.logger.info("[JWT DEBUG] DB lookup for '%s': id=%s, match=%s", username, db_result[0], user_id == db_result[0])
                 if not user_id == db_result[0]:
                     raise ValueError(
                         f"User with username: {username} is not in the database"
@@ -85,22 +145,23 @@ class JWTAuth:
 
                 request["user_id"] = user_id
                 request["user"] = username
+                request["_jwt_user"] = self.build_identity(username, db_result[1])
 
-                set_fallback = request.path in ["/api/prompt"]
+                set_fallback = path == "/api/prompt"
                 self.access_control.set_current_user_id(user_id, set_fallback)
 
             except jwt.ExpiredSignatureError:
-                self.logger.error(f"[JWT DEBUG] Token EXPIRED for {request.path}")
+                self.logger.error("[JWT DEBUG] Token EXPIRED for %s", path)
                 return await handle_unauthorized_access(
                     request, "/logout", message="Token has expired"
                 )
             except jwt.DecodeError as e:
-                self.logger.error(f"[JWT DEBUG] Token DECODE ERROR for {request.path}: {e}")
+                self.logger.error("[JWT DEBUG] Token DECODE ERROR for %s: %s", path, e)
                 return await handle_unauthorized_access(
                     request, "/logout", message="Token is invalid"
                 )
             except Exception as e:
-                self.logger.error(f"Unexpected error during token decoding: {e}")
+                self.logger.error("Unexpected error during token decoding: %s", e)
                 return await handle_unauthorized_access(
                     request, "/logout", message="Unexpected error"
                 )
@@ -113,10 +174,9 @@ class JWTAuth:
             message: str = "Authentication required",
         ) -> web.Response:
             """Handle unauthorized access cases."""
-            accept_header = request.headers.get("Accept", "")
-            if "text/html" in accept_header:
+            if prefers_html(request):
                 return web.HTTPFound(redirect_path)
             else:
-                return web.json_response({"error": message}, status=401)
+                return web.Response(body=json_error_body(message), status=401, content_type="application/json", charset="utf-8")
 
         return jwt_middleware
@@ -7,6 +7,13 @@ from typing import List, Optional, Callable
 LEVELS = {"INFO", "WARNING", "ERROR", "DEBUG"}
 
 
+class _IsoFormatter(logging.Formatter):
+    """Keeps the log file's "<isoformat> - LEVEL - message" line format."""
+
+    def formatTime(self, record, datefmt=None):
+        return datetime.fromtimestamp(record.created).isoformat()
+
+
 class Logger:
     def __init__(
         self,
@@ -17,44 +24,54 @@ class Logger:
         if not all(level in LEVELS for level in log_levels):
             raise ValueError(f"Invalid log levels provided. Valid levels are: {LEVELS}")
 
-        self.log_levels = log_levels
+        self.log_levels = frozenset(log_levels)
         self.log_file = log_file
         self.callback = callback
 
         self.logger = logging.getLogger("Usgromana")
 
-    def log_message(self, level: str, message: str) -> None:
+        # Dedicated non-propagating logger that owns one long-lived handle on the log file
+        self._file_logger = logging.getLogger(f"Usgromana.file.{log_file}")
+        self._file_logger.propagate = False
+        self._file_logger.setLevel(logging.DEBUG)
+        if not self._file_logger.handlers:
+            handler = logging.FileHandler(log_file, delay=True)
+            handler.setFormatter(_IsoFormatter("%(asctime)s - %(levelname)s - %(message)s"))
+            self._file_logger.addHandler(handler)
+
+        self._dispatch = {
+            "INFO": self.logger.info,
+            "WARNING": self.logger.warning,
+            "ERROR": self.logger.error,
+            "DEBUG": self.logger.debug,
+        }
+
+    def log_message(self, level: str, message: str, *args) -> None:
         if level not in self.log_levels:
             return
 
-        log_entry = f"{datetime.now().isoformat()} - {level} - {message}\n"
+        # Lazy %-style formatting: only pay for it when the level is enabled
+        if args:
+            message = message % args
 
-        with open(self.log_file, "a") as log_file:
-            log_file.write(log_entry)
+        self._file_logger.log(logging.getLevelName(level), message)
 
-        if level == "INFO":
-            self.logger.info(message)
-        elif level == "WARNING":
-            self.logger.warning(message)
-        elif level == "ERROR":
-            self.logger.error(message)
-        elif level == "DEBUG":
-            self.logger.debug(message)
+        self._dispatch[level](message)
 
         if self.callback:
-            self.callback(log_entry)
+            self.callback(f"{datetime.now().isoformat()} - {level} - {message}\n")
 
-    def info(self, message: str) -> None:
-        self.log_message("INFO", message)
+    def info(self, message: str, *args) -> None:
+        self.log_message("INFO", message, *args)
 
-    def warning(self, message: str) -> None:
-        self.log_message("WARNING", message)
+    def warning(self, message: str, *args) -> None:
+        self.log_message("WARNING", message, *args)
 
-    def error(self, message: str) -> None:
-        self.log_message("ERROR", message)
+    def error(self, message: str, *args) -> None:
+        self.log_message("ERROR", message, *args)
 
-    def debug(self, message: str) -> None:
-        self.log_message("DEBUG", message)
+    def debug(self, message: str, *args) -> None:
+        self.log_message("DEBUG", message, *args)
 
     def login_attempt(self, ip: str, username: str, password: str) -> None:
         self.info(
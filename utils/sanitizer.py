@@ -1,8 +1,50 @@
 import re
 import unicodedata
 import html
+from functools import lru_cache
 from aiohttp import web
-from bleach import clean
+
+# Optional: google-re2 matches in linear time, so crafted input can't make the XSS scan backtrack
+try:
+    import re2
+    RE2_AVAILABLE = True
+except ImportError:
+    RE2_AVAILABLE = False
+
+_ESCAPE_RE = re.compile(r"([;'\-()<>`=])")
+_STRIP_RE = re.compile(r"[;&|`]")
+# Every XSS pattern fused into one alternation; inline (?i) works for both engines
+_XSS_PATTERN = r"(?i)<script.*?>.*?</script>|javascript:|vbscript:|data:text/html|data:image"
+_XSS_RE = re2.compile(_XSS_PATTERN) if RE2_AVAILABLE else re.compile(_XSS_PATTERN)
+
+# bleach (and html5lib behind it) is imported on first sanitize, not at extension load
+_bleach_clean = None
+
+# Longer strings skip the memo so oversized attacker input can't churn it
+SANITIZE_CACHE_MAX_LEN = 1024
+
+
+def _sanitize_str(value: str) -> str:
+    global _bleach_clean
+    if _bleach_clean is None:
+        from bleach import clean as _bleach_clean
+
+    value = value.strip()
+    value = unicodedata.normalize("NFC", value)
+    value = html.escape(value)
+    value = value.replace("\r", "").replace("\n", "")
+    value = _ESCAPE_RE.sub(r"\\\1", value)
+    value = _STRIP_RE.sub("", value)
+    value = _bleach_clean(value, tags=[], attributes=[], protocols=[])
+
+    # Repeat until clean so removals can't splice a new match together
+    removed = 1
+    while removed:
+        value, removed = _XSS_RE.subn("", value)
+    return value
+
+
+_sanitize_str_cached = lru_cache(maxsize=4096)(_sanitize_str)
 
 
 class Sanitizer:
@@ -10,23 +52,9 @@ class Sanitizer:
     def sanitize_input(value):
         """Sanitize user input of various types to prevent security risks."""
         if isinstance(value, str):
-            value = value.strip()
-            value = unicodedata.normalize("NFC", value)
-            value = html.escape(value)
-            value = value.replace("\r", "").replace("\n", "")
-            value = re.sub(r"([;'\-()<>`=])", r"\\\1", value)
-            value = re.sub(r"[;&|`]", "", value)
-            value = clean(value, tags=[], attributes=[], protocols=[])
-
-            xss_patterns = [
-                r"<script.*?>.*?</script>",
-                r"javascript:",
-                r"vbscript:",
-                r"data:text/html",
-                r"data:image",
-            ]
-            for pattern in xss_patterns:
-                value = re.sub(pattern, "", value, flags=re.IGNORECASE)
+            if len(value) <= SANITIZE_CACHE_MAX_LEN:
+                return _sanitize_str_cached(value)
+            return _sanitize_str(value)
 
         elif isinstance(value, (int, float)):
             return value
@@ -1,60 +1,153 @@
 # --- START OF FILE utils/node_interceptor.py ---
+import hashlib
+import os
+import logging
+import threading
+from collections import OrderedDict
+
 import torch
+import torch.nn.functional as F
 import nodes
-import numpy as np
-from PIL import Image
 import latent_preview
 
 from ...utils.sfw_intercept.nsfw_guard import (
-    _get_nsfw_pipeline,
+    _classifier_stream,
+    _get_nsfw_tensor_classifier,
     is_sfw_enforced_for_current_session,
 )
+
+LOG = logging.getLogger("usgromana.interceptor")
+
 # --- CONFIGURATION ---
 SCORE_THRESHOLD = 0.50  
 
+# Save + Preview nodes often receive the same decoded image, so NSFW scores are
+# memoized per image, keyed by a hash of the exact resized + normalized tensor
+# the classifier would see: a verdict is only reused for an identical input.
+VERDICT_CACHE_SIZE = 256
+_verdict_cache = OrderedDict()  # {(shape, dtype, blake2b of model input): nsfw_score}
+_verdict_model = None  # model the cached scores came from
+
+# One zero per (dtype, device); expanded into a read-only black batch when an entire batch is blocked
+_black_cache = {}  # {(dtype, device): 0-dim zeros tensor}
+
+# Reused page-locked host buffer for CPU -> CUDA uploads of IMAGE batches
+_pinned_staging = {}  # {(shape, dtype): pinned tensor}
+
 # ----------------------------------------------------------------------------
 # PART 1: The Scanner
 # ----------------------------------------------------------------------------
-def check_tensor_nsfw(images_tensor):
+def _verdict_keys(x):
+    """
+    Exact per-image verdict cache keys for a batch of model inputs (NCHW, already
+    at the classifier's input size). Only this small tensor is read back to be
+    hashed, never the full-resolution IMAGE batch.
+    """
+    host = x.cpu()
+    keys = []
+    for img in host:
+        raw = img.contiguous().reshape(-1).view(torch.uint8).numpy()
+        keys.append((tuple(img.shape), str(img.dtype), hashlib.blake2b(raw, digest_size=16).digest()))
+    return keys
+
+
+def _to_device(t, device):
+    """
+    Move an IMAGE batch to the classifier device. CPU tensors bound for CUDA
+    go through a reused pinned buffer, so non_blocking is a real async DMA
+    rather than a synchronous pageable copy. The caller's later .cpu() of the
+    scores is the sync point.
+    """
+    if t.device.type != "cpu" or device.type != "cuda":
+        return t.to(device, non_blocking=True)
+
+    key = (tuple(t.shape), t.dtype)
+    buf = _pinned_staging.get(key)
+    if buf is None:
+        # Keep only the most recent shape; batches rarely change size mid-run
+        _pinned_staging.clear()
+        buf = torch.empty(key[0], dtype=t.dtype, pin_memory=True)
+        _pinned_staging[key] = buf
+    buf.copy_(t)
+    return buf.to(device, non_blocking=True)
+
+
+def scan_tensor_nsfw(images_tensor):
+    """
+    Classify every image in the batch in one forward pass.
+    Returns a per-image list of booleans (True = block).
+    """
+    if images_tensor is None or len(images_tensor) == 0: return []
+    count = len(images_tensor)
+
     # 1. CHECK USER PERMISSIONS FIRST
     # Use quiet mode to reduce logging during node execution
     if not is_sfw_enforced_for_current_session(quiet=True):
         # print("[Usgromana] 🛡️ SFW Disabled for this user. Bypassing scan.")
-        return False
+        return [False] * count
 
     # 2. Run Scan
-    print("[Usgromana] 🔍 Interceptor: Analysis starting...")
-    pipeline = _get_nsfw_pipeline()
-    if pipeline is None:
+    LOG.debug("[Usgromana] 🔍 Interceptor: Analysis starting (%d image(s))...", count)
+    # Batches already on a GPU are classified on that GPU (replica per device)
+    target = images_tensor.device if images_tensor.device.type == "cuda" else None
+    classifier = _get_nsfw_tensor_classifier(target)
+    if classifier is None:
         print("[Usgromana] ⚠️ WARN: Model failed. BLOCKING (Fail-Safe).")
-        return True 
+        return [True] * count
+    model, mean, std, size, nsfw_idx = classifier
+
+    global _verdict_model
+    if model is not _verdict_model:
+        _verdict_cache.clear()
+        _verdict_model = model
 
     try:
-        if images_tensor is None or len(images_tensor) == 0: return False
-        
-        i = 255. * images_tensor[0].cpu().numpy()
-        img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
-        
-        results = pipeline(img)
-        # print(f"[Usgromana] 🔍 Raw Output: {results}")
-
-        if not results: return False
-            
-        top = results[0]
-        label = top.get("label", "").lower()
-        score = float(top.get("score", 0.0))
-        
-        print(f"[Usgromana] 🔍 Decision: Label='{label}' Score={score:.4f}")
+        # IMAGE tensors are [B,H,W,C] floats in 0..1, which is what the processor
+        # produces after rescaling, so only resize + normalize are left to do.
+        # Keeping this on-device skips the numpy/PIL round-trip entirely.
+        with _classifier_stream(mean.device, images_tensor), torch.inference_mode():
+            x = _to_device(images_tensor[..., :3], mean.device).permute(0, 3, 1, 2)
+            # One antialiased resize for the whole batch on the device (done in fp32,
+            # before the cast, since antialiased half-precision kernels are patchy)
+            x = F.interpolate(x, size=size, mode="bilinear", align_corners=False, antialias=True)
+            x = (x.to(mean.dtype) - mean) / std
+
+            keys = _verdict_keys(x)
+            scores = [_verdict_cache.get(k) for k in keys]
+            misses = [i for i, s in enumerate(scores) if s is None]
+
+            if misses:
+                if len(misses) < count:
+                    x = x[misses]
+                probs = model(pixel_values=x).logits.softmax(-1)
+                for i, score in zip(misses, probs[:, nsfw_idx].float().cpu().tolist()):
+                    scores[i] = score
+                    _verdict_cache[keys[i]] = score
+
+        for k in keys:
+            _verdict_cache.move_to_end(k)
+        while len(_verdict_cache) > VERDICT_CACHE_SIZE:
+            _verdict_cache.popitem(last=False)
+
+        mask = []
+        for score in scores:
+            LOG.debug("[Usgromana] 🔍 Decision: NSFW Score=%.4f", score)
+
+            is_bad = score > SCORE_THRESHOLD
+            if is_bad:
+                print(f"[Usgromana] 🛑 BLOCKED NSFW (Score {score:.4f})")
+            mask.append(is_bad)
+
+        return mask
 
-        if label == "nsfw" and score > SCORE_THRESHOLD:
-            print(f"[Usgromana] 🛑 BLOCKED NSFW (Score {score:.4f})")
-            return True
-            
     except Exception as e:
         print(f"[Usgromana] ❌ Interceptor Error: {e}")
-        return True 
-    
-    return False
+        return [True] * count
+
+
+def check_tensor_nsfw(images_tensor):
+    """True if any image in the batch should be blocked."""
+    return any(scan_tensor_nsfw(images_tensor))
 
 # ----------------------------------------------------------------------------
 # PART 2: The Kill Switch
@@ -68,8 +161,8 @@ def disable_latent_previews():
     class SafeDummyPreviewer:
         def __init__(self, latent_format=None): pass
         def check_preview(self, i, preview_every, total_steps):
-            if preview_every == 0: return False
-            return (i % preview_every) == 0
+            # Decoding always yields None, so never ask for a preview step
+            return False
         def decode_latent_to_preview_image(self, preview_format, x0):
             return None # Return None = No Image
         def close(self): pass
@@ -79,6 +172,30 @@ def disable_latent_previews():
         
     latent_preview.get_previewer = safe_get_previewer
 
+def _warmup():
+    """Load the classifier and run one dummy forward so the first save doesn't pay for it."""
+    classifier = _get_nsfw_tensor_classifier()
+    if classifier is None:
+        return
+    model, mean, std, size, nsfw_idx = classifier
+    try:
+        with torch.inference_mode():
+            model(pixel_values=torch.zeros((1, mean.shape[1], *size), device=mean.device, dtype=mean.dtype))
+        print("[Usgromana] 🔥 NSFW classifier warmed up.")
+    except Exception as e:
+        print(f"[Usgromana] ⚠️ NSFW classifier warm-up failed: {e}")
+
+def _black_like(t):
+    """
+    All-black batch shaped like t: an expand() of one cached zero, so it costs
+    no memory whatever the resolution. Save/preview only read pixels.
+    """
+    key = (t.dtype, t.device)
+    black = _black_cache.get(key)
+    if black is None:
+        black = _black_cache[key] = torch.zeros((), dtype=t.dtype, device=t.device)
+    return black.expand(t.shape)
+
 # ----------------------------------------------------------------------------
 # PART 3: The Interceptor (Wrapper)
 # ----------------------------------------------------------------------------
@@ -93,20 +210,24 @@ def install_node_interceptor():
         return
 
     def intercepted_wrapper(self, images, filename_prefix="ComfyUI", prompt=None, extra_pnginfo=None, mode="unknown"):
-        is_bad = check_tensor_nsfw(images)
+        original = original_save if mode == "save" else original_preview
+
+        # Trusted users skip all tensor inspection (and never trigger the model load)
+        if not is_sfw_enforced_for_current_session(quiet=True):
+            return original(self, images, filename_prefix, prompt, extra_pnginfo)
 
-        if is_bad:
-            print(f"[Usgromana] 🛑 BLOCKED {mode}: Replacing with BLACK SQUARE.")
-            black_images = torch.zeros_like(images)
-            if mode == "save":
-                return original_save(self, black_images, filename_prefix, prompt, extra_pnginfo)
+        bad_mask = scan_tensor_nsfw(images)
+
+        if any(bad_mask):
+            print(f"[Usgromana] 🛑 BLOCKED {mode}: Replacing {sum(bad_mask)}/{len(bad_mask)} image(s) with BLACK SQUARE.")
+            if all(bad_mask):
+                images = _black_like(images)
             else:
-                return original_preview(self, black_images, filename_prefix, prompt, extra_pnginfo)
-        
-        if mode == "save":
-            return original_save(self, images, filename_prefix, prompt, extra_pnginfo)
-        else:
-            return original_preview(self, images, filename_prefix, prompt, extra_pnginfo)
+                # Only the flagged slices are blacked out; clean images in the batch pass through
+                images = images.clone()
+                images[torch.tensor(bad_mask, device=images.device)] = 0
+
+        return original(self, images, filename_prefix, prompt, extra_pnginfo)
 
     def save_patch(self, images, filename_prefix="ComfyUI", prompt=None, extra_pnginfo=None):
         return intercepted_wrapper(self, images, filename_prefix, prompt, extra_pnginfo, mode="save")
@@ -117,4 +238,8 @@ def install_node_interceptor():
     nodes.SaveImage.save_images = save_patch
     nodes.PreviewImage.save_images = preview_patch
     print("[Usgromana] 🛡️ Node Interceptor Active.")
+
+    # Opt-in: move model load + first-kernel selection off the first user's save
+    if os.getenv("USGROMANA_WARMUP") == "1":
+        threading.Thread(target=_warmup, name="usgromana-nsfw-warmup", daemon=True).start()
 # --- END OF FILE utils/node_interceptor.py ---
@@ -1,18 +1,53 @@
 # --- START OF FILE utils/nsfw_guard.py ---
 import os
+import copy
 import json
-from functools import lru_cache
+import io
+import logging
+import threading
+import contextlib
+import time
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import re
+import struct
+import zlib
+import sqlite3
+from functools import lru_cache, wraps
 from typing import Optional, Tuple, Dict
 
 from PIL import Image
 from PIL import PngImagePlugin
 from PIL.ExifTags import TAGS
-from transformers import pipeline
+import torch
+import torch.nn.functional as F
+
+try:
+    from torchvision.io import read_image, ImageReadMode
+    TORCHVISION_AVAILABLE = True
+except ImportError:
+    TORCHVISION_AVAILABLE = False
+
+try:
+    import piexif
+    PIEXIF_AVAILABLE = True
+except ImportError:
+    piexif = None
+    PIEXIF_AVAILABLE = False
 
 import folder_paths
 import comfy.model_management as model_management
 
 from ...globals import users_db, current_username_var
+from ...constants import NSFW_INDEX_FILE
+
+# Per-image / per-check chatter goes through logging at DEBUG so it is off by default;
+# USGROMANA_LOG=DEBUG (or INFO, ...) sets the level for every "usgromana.*" logger.
+LOG = logging.getLogger("usgromana.nsfw")
+_LOG_LEVEL = logging.getLevelName(os.getenv("USGROMANA_LOG", "").upper())
+if isinstance(_LOG_LEVEL, int):
+    logging.getLogger("usgromana").setLevel(_LOG_LEVEL)
 
 # --- CONFIGURATION ---
 # Using Falconsai for stricter detection
@@ -24,113 +59,564 @@ NSFW_METADATA_KEY = "UsgromanaNSFW"
 NSFW_SCORE_KEY = "UsgromanaNSFWScore"
 NSFW_LABEL_KEY = "UsgromanaNSFWLabel"
 
+# Only the model's explicit "nsfw" label above this probability counts as NSFW
+NSFW_LABEL = "nsfw"
+NSFW_THRESHOLD = 0.5
+
+# Extended attribute mirroring the embedded tag, so reads skip the image entirely.
+# Value: "is_nsfw\tscore\tlabel\tmtime_ns" (the stamp is ignored once the file changes).
+NSFW_XATTR_KEY = "user.usgromana.nsfw"
+XATTR_AVAILABLE = hasattr(os, "getxattr") and hasattr(os, "setxattr")
+
+# "Score: 0.93" inside the Windows-readable Comment / XPComment fields we write
+_SCORE_RE = re.compile(r'Score:\s*([\d.]+)')
+
+# /view and /static_gallery checks that miss the tag cache are queued and
+# classified together: up to NSFW_BATCH_SIZE files per forward pass, waiting
+# at most NSFW_BATCH_WINDOW seconds for a batch to fill.
+NSFW_BATCH_SIZE = 8
+NSFW_BATCH_WINDOW = 0.02
+
+# Files per forward pass for directory-wide scans (and the pipeline's default batch)
+NSFW_SCAN_BATCH_SIZE = 16
+# Directory-wide tag clears are file rewrites (I/O bound) and fan out across threads
+NSFW_IO_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+_scan_queue = None  # asyncio.Queue of (path, use_cache, future), created on first use
+_pending_scans = {}  # {(path, use_cache): future} so concurrent requests share one scan
+
+# Opt-in: answer untagged files with "blocked" immediately and tag them in the
+# background, instead of holding the request until the classifier finishes
+DEFER_SCAN = os.getenv("USGROMANA_DEFER_SCAN") == "1"
+
+# One CUDA stream per (thread, device): the interceptor (worker thread) and the
+# batched /view scanner (executor threads) can overlap their forwards on the GPU
+_classifier_streams = {}  # {(thread id, device): torch.cuda.Stream}
+
+# Opt-in: torch.compile the classifier used on IMAGE tensors (first call pays the compile)
+COMPILE_CLASSIFIER = os.getenv("USGROMANA_COMPILE") == "1"
+
+# Opt-in: int8 dynamic quantization of the classifier's Linear layers when it runs on CPU
+QUANTIZE_CLASSIFIER = os.getenv("USGROMANA_QUANTIZE") == "1"
+
 # --- GLOBAL STATE (The Bridge) ---
 # This variable holds the username of the person who most recently
 # queued a prompt. It bridges the Web Server and the Worker Thread.
 _LATEST_PROMPT_USER = "guest"
 
-# Cache for SFW enforcement checks to avoid repeated DB lookups and logging
-_SFW_CACHE = {}  # {username: (sfw_flag, last_logged_username)}
+# Cache for SFW enforcement checks to avoid repeated DB lookups and logging.
+# Entries expire after SFW_CACHE_TTL seconds or when users_db.revision moves.
+# Bounded LRU so a stream of distinct usernames cannot grow it without limit.
+SFW_CACHE_TTL = 30.0
+SFW_CACHE_MAXSIZE = 1024
+_SFW_CACHE = OrderedDict()  # {username: (expires_at, users_db.revision, sfw_flag)}
 _LAST_LOGGED_USER = None
 
 
+# In-memory tag memo: {path: ((mtime_ns, size), tag or None)}, LRU-bounded.
+# One entry per path (a rewritten file replaces its stale entry), untagged
+# files are remembered too, and writers drop just their own path.
+NSFW_TAG_MEMO_SIZE = 200_000
+_TAG_MEMO = OrderedDict()
+_TAG_MEMO_LOCK = threading.Lock()
+
+
 def _get_nsfw_tag(path: str) -> Optional[Dict]:
+    """
+    Get NSFW tag for an image, memoized on (path, mtime_ns, size) so an
+    unchanged file is only opened and parsed once.
+
+    Returns:
+        Dict with keys: is_nsfw, score, label
+        or None if not tagged
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    stamp = (st.st_mtime_ns, st.st_size)
+
+    with _TAG_MEMO_LOCK:
+        entry = _TAG_MEMO.get(path)
+        if entry is not None and entry[0] == stamp:
+            _TAG_MEMO.move_to_end(path)
+            return entry[1]
+
+    tag = _lookup_nsfw_tag(path, st.st_mtime_ns, st.st_size)
+
+    with _TAG_MEMO_LOCK:
+        _TAG_MEMO[path] = (stamp, tag)
+        _TAG_MEMO.move_to_end(path)
+        while len(_TAG_MEMO) > NSFW_TAG_MEMO_SIZE:
+            _TAG_MEMO.popitem(last=False)
+    return tag
+
+
+def _forget_nsfw_tag(path: str):
+    """Drop path's memo entry after its tag was written or cleared."""
+    with _TAG_MEMO_LOCK:
+        _TAG_MEMO.pop(path, None)
+
+
+def _lookup_nsfw_tag(path: str, mtime_ns: int, size: int) -> Optional[Dict]:
+    # Persistent index first (survives restarts), then the xattr stamp, then the file itself
+    tag = _index_get(path, mtime_ns, size)
+    if tag is not None:
+        return tag
+    tag = _read_nsfw_xattr(path, mtime_ns)
+    if tag is None:
+        tag = _read_nsfw_tag(path)
+    if tag is not None:
+        _index_put(path, mtime_ns, size, tag)
+    return tag
+
+
+_INDEX_LOCK = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def _nsfw_index() -> Optional[sqlite3.Connection]:
+    """
+    On-disk (path, mtime_ns, size) -> tag index, so tags read once are not
+    re-parsed from every image after a restart. None if it cannot be opened.
+    """
+    try:
+        os.makedirs(os.path.dirname(NSFW_INDEX_FILE), exist_ok=True)
+        conn = sqlite3.connect(NSFW_INDEX_FILE, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS nsfw_tags ("
+            "path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, "
+            "is_nsfw INTEGER, score REAL, label TEXT)"
+        )
+    except sqlite3.Error as e:
+        print(f"[Usgromana::NSFWGuard] Warning: NSFW tag index unavailable ({NSFW_INDEX_FILE}): {e}")
+        return None
+    # Once per process, off the caller's thread: drop rows for deleted/replaced files
+    threading.Thread(target=_prune_nsfw_index, args=(conn,), name="usgromana-nsfw-index-prune", daemon=True).start()
+    return conn
+
+
+def _prune_nsfw_index(conn: sqlite3.Connection, batch_size: int = 500):
+    """
+    Delete index rows whose file is gone or whose (mtime_ns, size) stamp no
+    longer matches, so the index doesn't grow without bound as outputs rotate.
+    Rows are matched on their old stamp, so a row re-put meanwhile survives.
+    """
+    try:
+        with _INDEX_LOCK:
+            rows = conn.execute("SELECT path, mtime_ns, size FROM nsfw_tags").fetchall()
+    except sqlite3.Error:
+        return
+
+    stale = []
+    for path, mtime_ns, size in rows:
+        try:
+            st = os.stat(path)
+            if st.st_mtime_ns == mtime_ns and st.st_size == size:
+                continue
+        except OSError:
+            pass
+        stale.append((path, mtime_ns, size))
+
+    try:
+        for start in range(0, len(stale), batch_size):
+            with _INDEX_LOCK:
+                conn.executemany(
+                    "DELETE FROM nsfw_tags WHERE path = ? AND mtime_ns = ? AND size = ?",
+                    stale[start:start + batch_size],
+                )
+    except sqlite3.Error:
+        return
+    if stale:
+        LOG.info("[Usgromana::NSFWGuard] Pruned %d stale NSFW index row(s)", len(stale))
+
+
+def _index_get(path: str, mtime_ns: int, size: int) -> Optional[Dict]:
+    conn = _nsfw_index()
+    if conn is None:
+        return None
+    try:
+        with _INDEX_LOCK:
+            row = conn.execute(
+                "SELECT is_nsfw, score, label FROM nsfw_tags WHERE path = ? AND mtime_ns = ? AND size = ?",
+                (os.path.abspath(path), mtime_ns, size),
+            ).fetchone()
+    except sqlite3.Error:
+        return None
+    if row is None:
+        return None
+    return {"is_nsfw": bool(row[0]), "score": row[1], "label": row[2]}
+
+
+def _index_put(path: str, mtime_ns: int, size: int, tag: Dict):
+    conn = _nsfw_index()
+    if conn is None:
+        return
+    try:
+        with _INDEX_LOCK:
+            conn.execute(
+                "INSERT OR REPLACE INTO nsfw_tags VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    os.path.abspath(path), mtime_ns, size,
+                    int(bool(tag.get("is_nsfw"))), float(tag.get("score", 0.0)), str(tag.get("label", "")),
+                ),
+            )
+    except sqlite3.Error:
+        pass
+
+
+def _index_delete(path: str):
+    conn = _nsfw_index()
+    if conn is None:
+        return
+    try:
+        with _INDEX_LOCK:
+            conn.execute("DELETE FROM nsfw_tags WHERE path = ?", (os.path.abspath(path),))
+    except sqlite3.Error:
+        pass
+
+
+def _read_nsfw_xattr(path: str, mtime_ns: int) -> Optional[Dict]:
+    """NSFW tag from the xattr stamp, or None if absent, unsupported or stale."""
+    if not XATTR_AVAILABLE:
+        return None
+    try:
+        raw = os.getxattr(path, NSFW_XATTR_KEY).decode("utf-8")
+        is_nsfw, score, label, stamped_ns = raw.split("\t", 3)
+        if int(stamped_ns) != mtime_ns:
+            return None
+        return {"is_nsfw": is_nsfw == "1", "score": float(score), "label": label}
+    except (OSError, ValueError):
+        return None
+
+
+def _remember_nsfw_tag(path: str, is_nsfw: bool, score: float, label: str):
+    """After a metadata write, record the tag in the xattr stamp and the index."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return
+    _write_nsfw_xattr(path, st.st_mtime_ns, is_nsfw, score, label)
+    _index_put(path, st.st_mtime_ns, st.st_size, {"is_nsfw": is_nsfw, "score": score, "label": label})
+
+
+def _write_nsfw_xattr(path: str, mtime_ns: int, is_nsfw: bool, score: float, label: str):
+    """Stamp the tag as an xattr (best effort)."""
+    if not XATTR_AVAILABLE:
+        return
+    try:
+        value = f"{int(is_nsfw)}\t{score}\t{label}\t{mtime_ns}".encode("utf-8")
+        os.setxattr(path, NSFW_XATTR_KEY, value)
+    except OSError:
+        # Filesystem without user xattrs (tmpfs on old kernels, some network mounts)
+        pass
+
+
+def _remove_nsfw_xattr(path: str):
+    if not XATTR_AVAILABLE:
+        return
+    try:
+        os.removexattr(path, NSFW_XATTR_KEY)
+    except OSError:
+        pass
+
+
+def _read_nsfw_tag(path: str) -> Optional[Dict]:
     """
     Get NSFW tag directly from image metadata.
-    
+    PNG text chunks and the JPEG EXIF segment are read straight from the file;
+    other formats (or files the fast readers reject) go through PIL.
+
     Returns:
         Dict with keys: is_nsfw, score, label
         or None if not tagged
     """
     try:
-        if not os.path.exists(path):
+        kind = _image_kind(path)
+
+        if kind == "png":
+            info = _read_png_text_chunks(path, keys=_PNG_TAG_KEYS)
+            if info is not None:
+                return _tag_from_text_info(info)
+
+        elif kind == "jpeg" and PIEXIF_AVAILABLE:
+            exif = _read_jpeg_exif_segment(path)
+            if exif is not None:
+                return _tag_from_exif_bytes(exif) if exif else None
+    except Exception:
+        # Fail silently - image may be corrupted or format not supported
+        return None
+
+    return _read_nsfw_tag_pil(path)
+
+
+# Extension -> metadata format; anything else goes through PIL's generic info
+_IMAGE_KINDS = {".png": "png", ".jpg": "jpeg", ".jpeg": "jpeg"}
+
+
+def _image_kind(path: str) -> str:
+    """'png', 'jpeg' or 'other', from a slice of the extension (no splitext)."""
+    return _IMAGE_KINDS.get(path[path.rfind("."):].lower(), "other")
+
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+# Text keys _tag_from_text_info looks at; the rest (workflow/prompt JSON) is skipped unread
+_PNG_TAG_KEYS = frozenset({NSFW_METADATA_KEY, NSFW_SCORE_KEY, NSFW_LABEL_KEY, "Keywords", "Comment"})
+_PNG_OWN_KEYS = frozenset({NSFW_METADATA_KEY, NSFW_SCORE_KEY, NSFW_LABEL_KEY})
+
+
+def _read_png_text_chunks(path: str, keys: Optional[frozenset] = None) -> Optional[Dict[str, str]]:
+    """
+    Collect tEXt/zTXt/iTXt key -> text from a PNG without decoding it.
+    Stops at the first IDAT, which is as far as PIL's img.info reads.
+    With `keys`, other chunks are seeked over without being read, and the
+    scan stops once our own NSFW keys have all been seen.
+    Returns None if the file is not a PNG.
+    """
+    info = {}
+    with open(path, "rb") as f:
+        if f.read(8) != PNG_SIGNATURE:
             return None
-        
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                break
+            length, chunk_type = struct.unpack(">I4s", header)
+            if chunk_type in (b"IDAT", b"IEND"):
+                break
+            if chunk_type not in (b"tEXt", b"zTXt", b"iTXt"):
+                f.seek(length + 4, os.SEEK_CUR)  # data + CRC
+                continue
+
+            if keys is not None:
+                # Keywords are at most 79 bytes + NUL; peek just that far
+                peek = f.read(min(length, 80))
+                if peek.partition(b"\0")[0].decode("latin-1") not in keys:
+                    f.seek(length - len(peek) + 4, os.SEEK_CUR)
+                    continue
+                data = peek + f.read(length - len(peek))
+            else:
+                data = f.read(length)
+            f.seek(4, os.SEEK_CUR)
+            key, _, rest = data.partition(b"\0")
+            try:
+                if chunk_type == b"tEXt":
+                    value = rest.decode("latin-1")
+                elif chunk_type == b"zTXt":
+                    value = zlib.decompress(rest[1:]).decode("latin-1")
+                else:
+                    compressed, rest = rest[0], rest[2:]
+                    _, _, rest = rest.partition(b"\0")  # language tag
+                    _, _, text = rest.partition(b"\0")  # translated keyword
+                    value = (zlib.decompress(text) if compressed else text).decode("utf-8")
+            except (zlib.error, UnicodeDecodeError, IndexError):
+                continue
+            info[key.decode("latin-1")] = value
+            if keys is not None and _PNG_OWN_KEYS.issubset(info):
+                break
+    return info
+
+
+_PNG_TEXT_CHUNKS = (b"tEXt", b"zTXt", b"iTXt")
+
+
+def _splice_png_text(path: str, pnginfo) -> bool:
+    """
+    Replace the text chunks ahead of the first IDAT with pnginfo's chunks,
+    copying every other chunk (and all pixel data) byte-for-byte, so
+    re-tagging never re-encodes the image.
+    Returns False if the file is not a well-formed PNG.
+    """
+    with open(path, "r+b") as f:
+        data = f.read()
+        if not data.startswith(PNG_SIGNATURE):
+            return False
+
+        out = [PNG_SIGNATURE]
+        pos = len(PNG_SIGNATURE)
+        while True:
+            if pos + 8 > len(data):
+                return False
+            length, chunk_type = struct.unpack_from(">I4s", data, pos)
+            if chunk_type == b"IDAT":
+                break
+            end = pos + 12 + length  # length + type + data + CRC
+            if chunk_type == b"IEND" or end > len(data):
+                return False
+            if chunk_type not in _PNG_TEXT_CHUNKS:
+                out.append(data[pos:end])
+            pos = end
+
+        # Our keys go first so tag reads stop before the big workflow/prompt chunks
+        chunks = sorted(
+            pnginfo.chunks,
+            key=lambda c: c[1].partition(b"\0")[0].decode("latin-1") not in _PNG_OWN_KEYS,
+        )
+        for chunk in chunks:
+            chunk_type, chunk_data = chunk[0], chunk[1]
+            crc = zlib.crc32(chunk_type + chunk_data) & 0xFFFFFFFF
+            out.append(struct.pack(">I", len(chunk_data)) + chunk_type + chunk_data + struct.pack(">I", crc))
+        out.append(data[pos:])
+
+        f.seek(0)
+        f.write(b"".join(out))
+        f.truncate()
+    return True
+
+
+def _insert_jpeg_exif(path: str, exif_bytes: bytes):
+    """Swap in a new APP1 EXIF segment via piexif; the scan data is copied, not re-encoded."""
+    with open(path, "r+b") as f:
+        out = io.BytesIO()
+        piexif.insert(exif_bytes, f.read(), out)
+        f.seek(0)
+        f.write(out.getvalue())
+        f.truncate()
+
+
+def _read_jpeg_exif_segment(path: str) -> Optional[bytes]:
+    """
+    Return the raw "Exif\\0\\0..." APP1 payload of a JPEG (what PIL puts in
+    img.info["exif"]), b"" if there is none, or None if the file is not a JPEG.
+    Only marker headers are read until the segment is found.
+    """
+    with open(path, "rb") as f:
+        if f.read(2) != b"\xff\xd8":
+            return None
+        while True:
+            marker = f.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                return b""
+            code = marker[1]
+            if code == 0xFF:
+                f.seek(-1, os.SEEK_CUR)  # fill byte
+                continue
+            if code == 0x01 or 0xD0 <= code <= 0xD8:
+                continue  # standalone markers carry no length
+            if code in (0xDA, 0xD9):
+                return b""  # start of scan / end of image: no metadata after this
+            size = f.read(2)
+            if len(size) < 2:
+                return b""
+            length = struct.unpack(">H", size)[0] - 2
+            if code == 0xE1:
+                payload = f.read(length)
+                if payload.startswith(b"Exif\0\0"):
+                    return payload
+            else:
+                f.seek(length, os.SEEK_CUR)
+
+
+def _tag_from_text_info(info: Dict) -> Optional[Dict]:
+    """NSFW tag from PNG text metadata (ours first, then Windows Keywords/Comment)."""
+    # First check our custom keys (primary source)
+    if NSFW_METADATA_KEY in info:
+        is_nsfw = info.get(NSFW_METADATA_KEY, '').lower() == 'true'
+        score = float(info.get(NSFW_SCORE_KEY, '0.0'))
+        label = info.get(NSFW_LABEL_KEY, '')
+        result = {
+            "is_nsfw": is_nsfw,
+            "score": score,
+            "label": label
+        }
+        return result
+
+    # Fallback: Check Windows-readable Keywords field (if written by our code)
+    if "Keywords" in info:
+        keywords = str(info.get("Keywords", "")).lower()
+        if "nsfw" in keywords:
+            # Found NSFW in Keywords, try to extract score from Comment
+            comment = str(info.get("Comment", ""))
+            score = 0.5  # Default score
+            label = "nsfw"
+            # Try to extract score from comment
+            score_match = _SCORE_RE.search(comment)
+            if score_match:
+                score = float(score_match.group(1))
+            result = {
+                "is_nsfw": True,
+                "score": score,
+                "label": label
+            }
+            return result
+    return None
+
+
+def _tag_from_exif_bytes(exif: bytes) -> Optional[Dict]:
+    """NSFW tag from a JPEG EXIF blob via piexif (our UserComment first, then XPKeywords)."""
+    exif_dict = piexif.load(exif)
+
+    # Check our custom UserComment first
+    if "Exif" in exif_dict and piexif.ExifIFD.UserComment in exif_dict["Exif"]:
+        user_comment = exif_dict["Exif"][piexif.ExifIFD.UserComment]
+        if isinstance(user_comment, bytes):
+            user_comment = user_comment.decode('utf-8', errors='ignore')
+        if user_comment.startswith('NSFW:'):
+            try:
+                data = json.loads(user_comment[5:])
+                return {
+                    "is_nsfw": data.get("is_nsfw", False),
+                    "score": data.get("score", 0.0),
+                    "label": data.get("label", "")
+                }
+            except (json.JSONDecodeError, ValueError):
+                pass
+
+    # Fallback: Check Windows XPKeywords field
+    if "0th" in exif_dict and piexif.ImageIFD.XPKeywords in exif_dict["0th"]:
+        keywords = exif_dict["0th"][piexif.ImageIFD.XPKeywords]
+        if isinstance(keywords, bytes):
+            keywords = keywords.decode('utf-16le', errors='ignore')
+        if "nsfw" in keywords.lower():
+            # Extract score from XPComment if available
+            score = 0.5
+            label = "nsfw"
+            if "0th" in exif_dict and piexif.ImageIFD.XPComment in exif_dict["0th"]:
+                comment = exif_dict["0th"][piexif.ImageIFD.XPComment]
+                if isinstance(comment, bytes):
+                    comment = comment.decode('utf-16le', errors='ignore')
+                score_match = _SCORE_RE.search(comment)
+                if score_match:
+                    score = float(score_match.group(1))
+            return {
+                "is_nsfw": True,
+                "score": score,
+                "label": label
+            }
+    return None
+
+
+def _read_nsfw_tag_pil(path: str) -> Optional[Dict]:
+    """
+    Get NSFW tag from image metadata via PIL (fallback for the fast paths).
+    
+    Returns:
+        Dict with keys: is_nsfw, score, label
+        or None if not tagged
+    """
+    try:
+        # A missing file raises here and falls into the except below
         img = Image.open(path)
-        ext = os.path.splitext(path)[1].lower()
+        kind = _image_kind(path)
         
         # For PNG: Check info metadata
-        if ext in ('.png',):
-            info = img.info
-            # First check our custom keys (primary source)
-            if NSFW_METADATA_KEY in info:
-                is_nsfw = info.get(NSFW_METADATA_KEY, '').lower() == 'true'
-                score = float(info.get(NSFW_SCORE_KEY, '0.0'))
-                label = info.get(NSFW_LABEL_KEY, '')
-                result = {
-                    "is_nsfw": is_nsfw,
-                    "score": score,
-                    "label": label
-                }
-                return result
-            
-            # Fallback: Check Windows-readable Keywords field (if written by our code)
-            if "Keywords" in info:
-                keywords = str(info.get("Keywords", "")).lower()
-                if "nsfw" in keywords:
-                    # Found NSFW in Keywords, try to extract score from Comment
-                    comment = str(info.get("Comment", ""))
-                    score = 0.5  # Default score
-                    label = "nsfw"
-                    # Try to extract score from comment
-                    import re
-                    score_match = re.search(r'Score:\s*([\d.]+)', comment)
-                    if score_match:
-                        score = float(score_match.group(1))
-                    result = {
-                        "is_nsfw": True,
-                        "score": score,
-                        "label": label
-                    }
-                    return result
+        if kind == "png":
+            tag = _tag_from_text_info(img.info)
+            if tag is not None:
+                return tag
         
         # For JPEG: Check EXIF (both our custom tag and Windows-readable fields)
-        elif ext in ('.jpg', '.jpeg'):
+        elif kind == "jpeg":
             try:
                 # Try piexif first (more reliable)
-                try:
-                    import piexif
-                    exif_dict = piexif.load(img.info.get('exif', b''))
-                    
-                    # Check our custom UserComment first
-                    if "Exif" in exif_dict and piexif.ExifIFD.UserComment in exif_dict["Exif"]:
-                        user_comment = exif_dict["Exif"][piexif.ExifIFD.UserComment]
-                        if isinstance(user_comment, bytes):
-                            user_comment = user_comment.decode('utf-8', errors='ignore')
-                        if user_comment.startswith('NSFW:'):
-                            try:
-                                data = json.loads(user_comment[5:])
-                                return {
-                                    "is_nsfw": data.get("is_nsfw", False),
-                                    "score": data.get("score", 0.0),
-                                    "label": data.get("label", "")
-                                }
-                            except (json.JSONDecodeError, ValueError):
-                                pass
-                    
-                    # Fallback: Check Windows XPKeywords field
-                    if "0th" in exif_dict and piexif.ImageIFD.XPKeywords in exif_dict["0th"]:
-                        keywords = exif_dict["0th"][piexif.ImageIFD.XPKeywords]
-                        if isinstance(keywords, bytes):
-                            keywords = keywords.decode('utf-16le', errors='ignore')
-                        if "nsfw" in keywords.lower():
-                            # Extract score from XPComment if available
-                            score = 0.5
-                            label = "nsfw"
-                            if "0th" in exif_dict and piexif.ImageIFD.XPComment in exif_dict["0th"]:
-                                comment = exif_dict["0th"][piexif.ImageIFD.XPComment]
-                                if isinstance(comment, bytes):
-                                    comment = comment.decode('utf-16le', errors='ignore')
-                                import re
-                                score_match = re.search(r'Score:\s*([\d.]+)', comment)
-                                if score_match:
-                                    score = float(score_match.group(1))
-                            return {
-                                "is_nsfw": True,
-                                "score": score,
-                                "label": label
-                            }
-                except ImportError:
+                if PIEXIF_AVAILABLE:
+                    tag = _tag_from_exif_bytes(img.info.get('exif', b''))
+                    if tag is not None:
+                        return tag
+                else:
                     # Fallback to PIL's basic EXIF
                     exif = img.getexif()
                     if exif:
@@ -182,20 +668,23 @@ def _set_nsfw_tag(path: str, is_nsfw: bool, score: float, label: str):
         label: Detection label
     """
     try:
-        if not os.path.exists(path):
+        # Image.open does the existence check itself; no separate stat
+        try:
+            img = Image.open(path)
+        except FileNotFoundError:
             return
-        
-        img = Image.open(path)
-        ext = os.path.splitext(path)[1].lower()
+        kind = _image_kind(path)
         
         # For PNG: Use PngInfo + Windows-compatible metadata
-        if ext in ('.png',):
-            # Read existing PNG info or create new
+        if kind == "png":
+            # Only the text chunks are rewritten; everything else is kept verbatim
+            text_info = _read_png_text_chunks(path)
+            source_info = text_info if text_info is not None else img.info
             pnginfo = PngImagePlugin.PngInfo()
             # Copy ALL existing text chunks (preserve existing metadata)
             # Exclude only the NSFW-related keys we're about to overwrite
             nsfw_keys_to_exclude = {NSFW_METADATA_KEY, NSFW_SCORE_KEY, NSFW_LABEL_KEY, "Keywords", "Subject", "Comment"}
-            for key, value in img.info.items():
+            for key, value in source_info.items():
                 # Preserve all metadata keys except NSFW ones we're overwriting
                 if key not in nsfw_keys_to_exclude:
                     pnginfo.add_text(key, str(value))
@@ -207,9 +696,9 @@ def _set_nsfw_tag(path: str, is_nsfw: bool, score: float, label: str):
             
             # Also add to Windows-readable fields (Keywords/Tags field in Windows Properties)
             # Windows reads "Keywords" from PNG tEXt chunks - this is what shows in Properties > Details > Tags
-            existing_keywords = img.info.get("Keywords", None)
-            existing_subject = img.info.get("Subject", None)
-            existing_comment = img.info.get("Comment", None)
+            existing_keywords = source_info.get("Keywords", None)
+            existing_subject = source_info.get("Subject", None)
+            existing_comment = source_info.get("Comment", None)
             
             if is_nsfw:
                 # Add to Keywords field (Windows Properties shows this in Tags)
@@ -239,20 +728,15 @@ def _set_nsfw_tag(path: str, is_nsfw: bool, score: float, label: str):
                 # So we don't need to add them back here - they're already preserved
                 pass
             
-            # Save with metadata
-            img.save(path, "PNG", pnginfo=pnginfo, optimize=False)
+            # Save with metadata (re-encode only if the chunks could not be spliced)
+            if text_info is None or not _splice_png_text(path, pnginfo):
+                img.save(path, "PNG", pnginfo=pnginfo, optimize=False)
         
         # For JPEG: Use EXIF (Windows-readable)
-        elif ext in ('.jpg', '.jpeg'):
+        elif kind == "jpeg":
             try:
                 # Try to use piexif for proper EXIF handling (if available)
-                piexif_available = False
-                try:
-                    import piexif
-                    piexif_available = True
-                except ImportError:
-                    pass
-                if piexif_available:
+                if PIEXIF_AVAILABLE:
                     # Load existing EXIF or create new
                     exif_dict = {}
                     try:
@@ -310,10 +794,10 @@ def _set_nsfw_tag(path: str, is_nsfw: bool, score: float, label: str):
                             exif_dict["0th"][piexif.ImageIFD.XPComment] = f"NSFW Content Detected - Score: {score:.2f}, Label: {label}".encode('utf-16le')
                     # If SFW, preserve existing Windows-readable fields (don't overwrite)
                     
-                    # Convert back to bytes and save
+                    # Convert back to bytes and splice into the file
                     exif_bytes = piexif.dump(exif_dict)
-                    img.save(path, "JPEG", quality=95, exif=exif_bytes, optimize=False)
-                if not piexif_available:
+                    _insert_jpeg_exif(path, exif_bytes)
+                if not PIEXIF_AVAILABLE:
                     # Fallback: Use PIL's basic EXIF (less reliable but no extra dependency)
                     exif_dict = {}
                     if hasattr(img, 'getexif'):
@@ -334,7 +818,7 @@ def _set_nsfw_tag(path: str, is_nsfw: bool, score: float, label: str):
                     img.save(path, "JPEG", quality=95, exif=exif_bytes if exif_bytes else None, optimize=False)
             except Exception as e:
                 # If EXIF writing fails, at least try to save the image
-                print(f"[Usgromana::NSFWGuard] Warning: Could not write EXIF to {path}: {e}")
+                LOG.warning("[Usgromana::NSFWGuard] Warning: Could not write EXIF to %s: %s", path, e)
                 img.save(path, "JPEG", quality=95, optimize=False)
         
         # For other formats: Try to save in info
@@ -351,10 +835,15 @@ def _set_nsfw_tag(path: str, is_nsfw: bool, score: float, label: str):
             except Exception:
                 # Some formats don't support metadata, fail silently
                 pass
-        
+
+        _remember_nsfw_tag(path, is_nsfw, score, label)
+
     except Exception as e:
         # Fail silently - image may be read-only or format doesn't support metadata
-        print(f"[Usgromana::NSFWGuard] Warning: Could not write metadata to {path}: {e}")
+        LOG.warning("[Usgromana::NSFWGuard] Warning: Could not write metadata to %s: %s", path, e)
+    finally:
+        # Coarse-mtime filesystems may not move the stamp on a quick rewrite
+        _forget_nsfw_tag(path)
 
 
 def set_nsfw_tag_manual(path: str, is_nsfw: bool, score: float = 1.0, label: str = "manual"):
@@ -390,19 +879,25 @@ def clear_nsfw_tag(path: str):
     """
     
     try:
-        if not os.path.exists(path):
+        try:
+            img = Image.open(path)
+        except FileNotFoundError:
             return
-        
-        img = Image.open(path)
-        ext = os.path.splitext(path)[1].lower()
+
+        _remove_nsfw_xattr(path)
+        _index_delete(path)
+
+        kind = _image_kind(path)
         
         # For PNG: Remove only NSFW-related metadata, preserve everything else
-        if ext in ('.png',):
+        if kind == "png":
+            text_info = _read_png_text_chunks(path)
+            source_info = text_info if text_info is not None else img.info
             pnginfo = PngImagePlugin.PngInfo()
             # Copy ALL existing text chunks, but filter out NSFW-related content
             excluded_nsfw_keys = {NSFW_METADATA_KEY, NSFW_SCORE_KEY, NSFW_LABEL_KEY}
             
-            for key, value in img.info.items():
+            for key, value in source_info.items():
                 # Skip our custom NSFW keys
                 if key in excluded_nsfw_keys:
                     continue
@@ -434,14 +929,14 @@ def clear_nsfw_tag(path: str):
                     pnginfo.add_text(key, str(value))
             
             # Save with preserved metadata (NSFW tags removed)
-            img.save(path, "PNG", pnginfo=pnginfo, optimize=False)
+            if text_info is None or not _splice_png_text(path, pnginfo):
+                img.save(path, "PNG", pnginfo=pnginfo, optimize=False)
         
         # For JPEG: Remove only NSFW-related metadata, preserve everything else
-        elif ext in ('.jpg', '.jpeg'):
+        elif kind == "jpeg":
             
             # Try to use piexif for proper EXIF handling (if available)
-            try:
-                import piexif
+            if PIEXIF_AVAILABLE:
                 # Load existing EXIF
                 exif_dict = {}
                 try:
@@ -494,8 +989,8 @@ def clear_nsfw_tag(path: str):
                 
                 # Convert back to bytes and save (preserving all non-NSFW metadata)
                 exif_bytes = piexif.dump(exif_dict)
-                img.save(path, "JPEG", quality=95, exif=exif_bytes, optimize=False)
-            except ImportError:
+                _insert_jpeg_exif(path, exif_bytes)
+            else:
                 # Fallback: Use PIL's basic EXIF
                 exif_dict = {}
                 if hasattr(img, 'getexif'):
@@ -516,7 +1011,9 @@ def clear_nsfw_tag(path: str):
                 img.save(path, "JPEG", quality=95, exif=exif_bytes, optimize=False)
         
     except Exception as e:
-        print(f"[Usgromana::NSFWGuard] Warning: Could not clear metadata from {path}: {e}")
+        LOG.warning("[Usgromana::NSFWGuard] Warning: Could not clear metadata from %s: %s", path, e)
+    finally:
+        _forget_nsfw_tag(path)
 
 def set_latest_prompt_user(username: str | None):
     """
@@ -530,15 +1027,36 @@ def set_latest_prompt_user(username: str | None):
     effective = username or "guest"
     _LATEST_PROMPT_USER = effective
 
-    # Debug so we can see it changing per prompt:
-    print(f"[Usgromana::NSFWGuard] set_latest_prompt_user → {effective!r}")
+    # Debug so we can see it changing per prompt (USGROMANA_LOG=DEBUG):
+    LOG.debug("[Usgromana::NSFWGuard] set_latest_prompt_user → %r", effective)
 
 
-@lru_cache(maxsize=1)
-def _get_nsfw_pipeline():
+# Model/pipeline/classifier construction is serialized, so the warm-up thread and
+# the first real save (or two first saves) never load or compile the model twice
+_MODEL_LOAD_LOCK = threading.RLock()
+
+
+def _load_once(maxsize=1):
+    """lru_cache whose calls run under _MODEL_LOAD_LOCK: a miss is computed by one thread, others wait for it."""
+    def decorate(fn):
+        cached = lru_cache(maxsize=maxsize)(fn)
+
+        @wraps(fn)
+        def wrapper(*args):
+            with _MODEL_LOAD_LOCK:
+                return cached(*args)
+
+        wrapper.cache_clear = cached.cache_clear
+        return wrapper
+    return decorate
+
+
+@_load_once()
+def _load_nsfw_model():
     """
-    Load the HuggingFace image-classification pipeline.
+    Load the image processor and classification model once.
     Handles auto-downloading and device selection (CUDA/MPS/CPU).
+    Returns (processor, model) or None if loading failed.
     """
     base = folder_paths.base_path
     local_model_dir = os.path.join(base, "models", "nsfw_detector", MODEL_FOLDER_NAME)
@@ -554,36 +1072,280 @@ def _get_nsfw_pipeline():
     # 2. Determine Compute Device
     device = model_management.get_torch_device()
     device_str = str(device)
-    pipe_device = -1  # Default to CPU
 
-    if "cuda" in device_str:
-        try:
-            # Handle "cuda:0" vs just "cuda"
-            pipe_device = int(device_str.split(":")[1]) if ":" in device_str else 0
-        except Exception:
-            pipe_device = 0
-    elif "mps" in device_str:
-        # Mac Silicon support
-        pipe_device = "mps"
-
-    # 3. Initialize Pipeline
+    # Half precision on CUDA/MPS halves weight/activation traffic and uses tensor cores;
+    # the decision is a 0.5 threshold, so fp16 drift does not matter.
+    dtype = torch.float16 if device.type in ("cuda", "mps") else torch.float32
+
+    # 3. Load Processor + Model
+    # transformers is imported here, not at module load: SFW-disabled installs never pay for it
     try:
-        clf = pipeline("image-classification", model=model_source, device=pipe_device)
-        return clf
+        from transformers import AutoImageProcessor, AutoModelForImageClassification
+
+        processor = AutoImageProcessor.from_pretrained(model_source)
+        try:
+            model = AutoModelForImageClassification.from_pretrained(model_source, torch_dtype=dtype)
+            model = model.to(device).eval()
+        except Exception as e:
+            if dtype == torch.float32:
+                raise
+            print(f"[Usgromana::NSFWGuard] ⚠️ fp16 load failed on {device_str}, using fp32. Error: {e}")
+            model = AutoModelForImageClassification.from_pretrained(model_source, torch_dtype=torch.float32)
+            model = model.to(device).eval()
     except Exception as e:
         print(f"[Usgromana::NSFWGuard] ❌ CRITICAL: Failed to load NSFW model. Error: {e}")
         return None
 
+    if QUANTIZE_CLASSIFIER and device.type == "cpu":
+        try:
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            print("[Usgromana::NSFWGuard] ✅ NSFW classifier quantized to int8.")
+        except Exception as e:
+            print(f"[Usgromana::NSFWGuard] ⚠️ int8 quantization failed, using fp32 model. Error: {e}")
+
+    return processor, model
+
+
+@_load_once()
+def _get_nsfw_pipeline():
+    """
+    HuggingFace image-classification pipeline around the loaded model.
+    Kept for the public API (api.py); internal callers use the model directly.
+    """
+    loaded = _load_nsfw_model()
+    if loaded is None:
+        return None
+    processor, model = loaded
+
+    try:
+        from transformers import pipeline
+
+        pipe = pipeline(
+            "image-classification", model=model, image_processor=processor,
+            device=model.device, batch_size=NSFW_SCAN_BATCH_SIZE,
+        )
+        # Pipelines wrap forward() in no_grad; inference_mode also skips the
+        # autograd version-counter bookkeeping
+        if hasattr(pipe, "get_inference_context"):
+            pipe.get_inference_context = lambda: torch.inference_mode
+        return pipe
+    except Exception as e:
+        print(f"[Usgromana::NSFWGuard] ❌ CRITICAL: Failed to build NSFW pipeline. Error: {e}")
+        return None
+
+
+def _get_nsfw_tensor_classifier(device=None):
+    """
+    Direct-tensor view of the loaded model for callers that already hold
+    an IMAGE tensor: (model, mean, std, size, nsfw_idx).
+    mean/std are NCHW-broadcastable constants on the model's device and in
+    the model's dtype, so inputs normalized with them are ready to run.
+    Passing a device other than the model's gets a cached replica there, so
+    tensors living on a second GPU are classified where they are.
+    Returns None if the model (or its "nsfw" label) is unavailable.
+    """
+    loaded = _load_nsfw_model()
+    if loaded is None:
+        return None
+    model_device = loaded[1].device
+
+    # One cache entry per physical device: None, "cuda" and "cuda:0" must not
+    # build (and, under USGROMANA_COMPILE, compile) separate classifiers
+    device = model_device if device is None else torch.device(device)
+    if device.index is None:
+        if device.type == "cuda":
+            device = torch.device("cuda", torch.cuda.current_device())
+        elif device.type == model_device.type:
+            device = model_device
+    return _tensor_classifier_on(device)
+
+
+@_load_once(maxsize=None)
+def _tensor_classifier_on(device):
+    loaded = _load_nsfw_model()
+    if loaded is None:
+        return None
+    processor, model = loaded
+
+    try:
+        if device != model.device:
+            model = copy.deepcopy(model).to(device)
+        device = model.device
+
+        size = _processor_input_size(processor)
+
+        dtype = model.dtype
+
+        mean = torch.tensor(processor.image_mean, device=device, dtype=dtype).view(1, -1, 1, 1)
+        std = torch.tensor(processor.image_std, device=device, dtype=dtype).view(1, -1, 1, 1)
+
+        nsfw_idx = next(
+            (int(idx) for idx, label in model.config.id2label.items() if str(label).lower() == "nsfw"),
+            None,
+        )
+        if nsfw_idx is None:
+            print("[Usgromana::NSFWGuard] ❌ Model has no 'nsfw' label.")
+            return None
+    except Exception as e:
+        print(f"[Usgromana::NSFWGuard] ❌ Failed to prepare tensor classifier. Error: {e}")
+        return None
+
+    if COMPILE_CLASSIFIER:
+        model = _compile_classifier(model, mean, size)
+
+    return model, mean, std, size, nsfw_idx
+
+
+def _processor_input_size(processor) -> Tuple[int, int]:
+    """(height, width) the HF image processor resizes to."""
+    size = processor.size
+    if "height" in size:
+        return size["height"], size["width"]
+    edge = size.get("shortest_edge", 224)
+    return edge, edge
+
+
+def _compile_classifier(model, mean, size):
+    """
+    torch.compile the model and trace it once at its native input size.
+    Falls back to the eager model if compilation is unsupported or fails.
+    """
+    try:
+        compiled = torch.compile(model, mode="reduce-overhead", fullgraph=True)
+        with torch.inference_mode():
+            compiled(pixel_values=torch.zeros((1, mean.shape[1], *size), device=mean.device, dtype=mean.dtype))
+        print("[Usgromana::NSFWGuard] ✅ NSFW classifier compiled.")
+        return compiled
+    except Exception as e:
+        print(f"[Usgromana::NSFWGuard] ⚠️ torch.compile unavailable, using eager model. Error: {e}")
+        return model
+
+
+@contextlib.contextmanager
+def _classifier_stream(device, *inputs):
+    """
+    Context that runs classifier work on this thread's own CUDA stream.
+    Everything from upload to the final .cpu() must happen inside it.
+    `inputs` are GPU tensors produced on the caller's stream that the
+    classifier will read. A no-op on CPU/MPS.
+    """
+    if device.type != "cuda":
+        yield
+        return
+    key = (threading.get_ident(), device)
+    stream = _classifier_streams.get(key)
+    if stream is None:
+        stream = _classifier_streams[key] = torch.cuda.Stream(device=device)
+
+    # Order after pending work on the producer stream (inputs, weights, mean/std),
+    # and keep the allocator from reusing the inputs' memory while we read them
+    stream.wait_stream(torch.cuda.current_stream(device))
+    for t in inputs:
+        if t.is_cuda:
+            t.record_stream(stream)
+    try:
+        with torch.cuda.stream(stream):
+            yield
+    finally:
+        # Results are consumed on the caller's stream/host after this point
+        stream.synchronize()
+
+
+def _prepare_file_pixels(pixels, mean, std, size):
+    """uint8 CHW from read_image -> normalized 1xCxHxW model input on the classifier device."""
+    x = pixels.unsqueeze(0).to(mean.device, non_blocking=True).float().div_(255)
+    x = F.interpolate(x, size=size, mode="bilinear", align_corners=False, antialias=True)
+    return (x.to(mean.dtype) - mean) / std
+
+
+def _score_image_file_tensor(path: str) -> Optional[Tuple[str, float]]:
+    """
+    Decode with torchvision.io.read_image (uint8 CHW) and run the tensor
+    classifier, skipping PIL and the processor. None means "use the PIL path".
+    """
+    classifier = _get_nsfw_tensor_classifier()
+    if classifier is None:
+        return None
+    model, mean, std, size, nsfw_idx = classifier
+
+    try:
+        pixels = read_image(path, mode=ImageReadMode.RGB)
+    except Exception:
+        return None  # format torchvision can't decode; PIL gets a try
+
+    try:
+        with _classifier_stream(mean.device), torch.inference_mode():
+            x = _prepare_file_pixels(pixels, mean, std, size)
+            score = float(model(pixel_values=x).logits.softmax(-1)[0, nsfw_idx])
+    except Exception as e:
+        LOG.error("[Usgromana::NSFWGuard] Error classifying image %s: %s", path, e)
+        return None
+
+    return "nsfw", score
+
+
+def _score_image_file_pil(path: str) -> Optional[Tuple[str, float]]:
+    """Open with PIL and run the HF processor + model; returns (label, score) or None."""
+    return _score_image_files_pil([path])[0]
+
+
+def _score_image_files_pil(paths: list) -> list:
+    """
+    PIL + HF processor route for a list of files, classified in one forward pass.
+    Returns a (label, score) or None per path.
+    """
+    results = [None] * len(paths)
+    loaded = _load_nsfw_model()
+    if loaded is None:
+        return results
+    processor, model = loaded
+    height, width = _processor_input_size(processor)
+
+    opened, images = [], []
+    for i, path in enumerate(paths):
+        try:
+            with Image.open(path) as img:
+                # Shrink to the model input here (JPEG draft mode decodes at reduced
+                # scale) so the processor gets small, uniform images
+                img.draft("RGB", (width, height))
+                images.append(img.convert("RGB").resize((width, height), Image.BILINEAR))
+            opened.append(i)
+        except Exception as e:
+            LOG.error("[Usgromana::NSFWGuard] Error reading image %s: %s", path, e)
+    if not images:
+        return results
+
+    try:
+        inputs = processor(images=images, return_tensors="pt")
+        with _classifier_stream(model.device), torch.inference_mode():
+            pixel_values = inputs["pixel_values"].to(model.device, dtype=model.dtype)
+            probs = model(pixel_values=pixel_values).logits.softmax(-1).float().cpu().tolist()
+    except Exception as e:
+        LOG.error("[Usgromana::NSFWGuard] Error classifying %s image(s): %s", len(images), e)
+        return results
+
+    labels = [str(model.config.id2label[i]).lower() for i in range(len(probs[0]))]
+    nsfw_idx = labels.index("nsfw") if "nsfw" in labels else None
+
+    for i, row in zip(opened, probs):
+        # Use the NSFW probability if the model has that label, otherwise the top label
+        if nsfw_idx is not None:
+            results[i] = ("nsfw", row[nsfw_idx])
+        else:
+            top = max(range(len(row)), key=row.__getitem__)
+            results[i] = (labels[top], row[top])
+    return results
+
 
 def _classify_image_path(path: str, use_cache: bool = True) -> Optional[Tuple[str, float]]:
     """
     Helper to run classification on an image file path.
     Checks cache first, only scans if not cached.
-    
+
     Args:
         path: Image file path
         use_cache: If True, check cache before scanning
-    
+
     Returns:
         (label, score) tuple or None
     """
@@ -592,54 +1354,152 @@ def _classify_image_path(path: str, use_cache: bool = True) -> Optional[Tuple[st
         tag = _get_nsfw_tag(path)
         if tag is not None:
             return tag.get("label", "").lower(), tag.get("score", 0.0)
-    
-    # 2. Scan image (slow path)
-    clf = _get_nsfw_pipeline()
-    if clf is None:
-        return None
 
-    try:
-        with Image.open(path) as img:
-            img = img.convert("RGB")
-            result = clf(img)
-    except Exception as e:
-        print(f"[Usgromana::NSFWGuard] Error reading image {path}: {e}")
+    # 2. Scan image (slow path): decode straight to a tensor when possible
+    result = _score_image_file_tensor(path) if TORCHVISION_AVAILABLE else None
+    if result is None:
+        result = _score_image_file_pil(path)
+    if result is None:
         return None
+    return _record_classification(path, *result, use_cache=use_cache)
 
-    if not result:
-        return None
-    
-    # Find NSFW label in all results (hypothesis A: model returns multiple labels)
-    nsfw_result = None
-    normal_result = None
-    for r in result:
-        r_label = r.get("label", "").lower()
-        r_score = float(r.get("score", 0.0))
-        if r_label == "nsfw":
-            nsfw_result = (r_label, r_score)
-        elif r_label == "normal":
-            normal_result = (r_label, r_score)
-    
-    # Use NSFW result if found, otherwise use first result (current behavior)
-    if nsfw_result:
-        label, score = nsfw_result
-    else:
-        top = result[0]
-        label = top.get("label", "").lower()
-        score = float(top.get("score", 0.0))
-    
-    # 3. Determine if NSFW (only trust model's explicit "nsfw" label)
+
+# Striped per-path locks serializing auto-tag writes (bounded, unlike a lock per path)
+_TAG_WRITE_LOCKS = [threading.Lock() for _ in range(64)]
+
+
+def _record_classification(path: str, label: str, score: float, use_cache: bool = True) -> Tuple[str, float]:
+    """Tag a fresh classification result onto the file (if caching) and pass it through."""
+    # Determine if NSFW (only trust model's explicit "nsfw" label)
     # Removed strict heuristic - it was causing too many false positives
-    # Only block if model explicitly says "nsfw" with score > 0.5
-    is_nsfw = (label == "nsfw" and score > 0.5)
-    
-    # Cache the result
+    is_nsfw = _is_nsfw_verdict(label, score)
+
+    # Cache the result, once: a concurrent scan of the same file may have tagged it already
     if use_cache:
-        _set_nsfw_tag(path, is_nsfw, score, label)
-    
+        with _TAG_WRITE_LOCKS[hash(path) % len(_TAG_WRITE_LOCKS)]:
+            if _get_nsfw_tag(path) is None:
+                _set_nsfw_tag(path, is_nsfw, score, label)
+
     return label, score
 
 
+def _is_nsfw_verdict(label: str, score: float) -> bool:
+    """Single decision rule shared by tagging, blocking and bulk scans."""
+    # Threshold first: a float compare is cheaper than the string compare and
+    # rejects most (safe) results on its own
+    return score > NSFW_THRESHOLD and label == NSFW_LABEL
+
+
+@lru_cache(maxsize=1)
+def _decode_pool() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="usgromana-decode")
+
+
+def _read_image_or_none(path: str):
+    """uint8 CHW RGB tensor, or None for formats torchvision can't decode."""
+    try:
+        return read_image(path, mode=ImageReadMode.RGB)
+    except Exception:
+        return None
+
+
+def _classify_image_paths(paths: list, use_cache: bool = True) -> list:
+    """
+    Batched form of _classify_image_path for files that missed the tag cache.
+    Everything torchvision can decode goes through one forward pass; the rest
+    fall back to the per-file PIL route. Returns a (label, score) or None per path.
+    """
+    results = [None] * len(paths)
+
+    classifier = _get_nsfw_tensor_classifier() if TORCHVISION_AVAILABLE else None
+    if classifier is not None:
+        model, mean, std, size, nsfw_idx = classifier
+        # read_image decodes in C++ without the GIL, so the batch decodes in parallel
+        decoded, pixels = [], []
+        for i, image in enumerate(_decode_pool().map(_read_image_or_none, paths)):
+            if image is not None:
+                pixels.append(image)
+                decoded.append(i)
+
+        if pixels:
+            try:
+                with _classifier_stream(mean.device), torch.inference_mode():
+                    # Files differ in size, so each is resized on its own before stacking
+                    x = torch.cat([_prepare_file_pixels(p, mean, std, size) for p in pixels])
+                    scores = model(pixel_values=x).logits.softmax(-1)[:, nsfw_idx].float().cpu().tolist()
+                for i, score in zip(decoded, scores):
+                    results[i] = _record_classification(paths[i], "nsfw", score, use_cache=use_cache)
+            except Exception as e:
+                LOG.error("[Usgromana::NSFWGuard] Error classifying batch of %s image(s): %s", len(pixels), e)
+
+    leftover = [i for i, result in enumerate(results) if result is None]
+    if leftover:
+        for i, result in zip(leftover, _score_image_files_pil([paths[i] for i in leftover])):
+            if result is not None:
+                results[i] = _record_classification(paths[i], *result, use_cache=use_cache)
+
+    return results
+
+
+async def _classify_image_path_async(path: str, use_cache: bool = True) -> Optional[Tuple[str, float]]:
+    """Queue a file for the batched background scanner and wait for its result."""
+    # shield: one client disconnecting must not cancel a scan others are waiting on
+    return await asyncio.shield(_submit_scan(path, use_cache))
+
+
+def _submit_scan(path: str, use_cache: bool) -> asyncio.Future:
+    """Future for a file's scan, joining one already queued or running for it."""
+    global _scan_queue
+    key = (path, use_cache)
+    future = _pending_scans.get(key)
+    if future is not None:
+        return future
+
+    loop = asyncio.get_running_loop()
+    if _scan_queue is None:
+        _scan_queue = asyncio.Queue()
+        loop.create_task(_scan_worker(_scan_queue))
+
+    future = loop.create_future()
+    _pending_scans[key] = future
+    future.add_done_callback(lambda _: _pending_scans.pop(key, None))
+    _scan_queue.put_nowait((path, use_cache, future))
+    return future
+
+
+async def _scan_worker(queue: asyncio.Queue):
+    """
+    Drain up to NSFW_BATCH_SIZE queued files (waiting at most NSFW_BATCH_WINDOW
+    for stragglers) and classify them together off the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        items = [await queue.get()]
+        deadline = loop.time() + NSFW_BATCH_WINDOW
+        while len(items) < NSFW_BATCH_SIZE:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        # Group by use_cache so each executor call has a single tagging policy
+        for use_cache in {item[1] for item in items}:
+            group = [item for item in items if item[1] == use_cache]
+            try:
+                results = await loop.run_in_executor(
+                    None, _classify_image_paths, [item[0] for item in group], use_cache
+                )
+            except Exception as e:
+                LOG.error("[Usgromana::NSFWGuard] Batched scan failed: %s", e)
+                results = [None] * len(group)
+            for (_, _, future), result in zip(group, results):
+                if not future.done():
+                    future.set_result(result)
+
+
 def _resolve_effective_username() -> str:
     """
     Decide which username to use for policy:
@@ -664,9 +1524,9 @@ def _resolve_effective_username() -> str:
         username = "guest"
 
     # Debug: see what the resolver is doing
-    print(
-        f"[Usgromana::NSFWGuard] DEBUG resolve_user: ctx={ctx_user!r} "
-        f"latest={_LATEST_PROMPT_USER!r} -> using={username!r}"
+    LOG.debug(
+        "[Usgromana::NSFWGuard] resolve_user: ctx=%r latest=%r -> using=%r",
+        ctx_user, _LATEST_PROMPT_USER, username,
     )
 
     return username
@@ -682,8 +1542,11 @@ def is_sfw_enforced_for_current_session(quiet: bool = False) -> bool:
     Returns:
         bool: True if SFW is enforced, False otherwise
     """
-    global _LAST_LOGGED_USER
-    
+    return is_sfw_enforced_for_user(_session_username(), quiet=quiet)
+
+
+def _session_username() -> str | None:
+    """Username for the current request (ContextVar) or, on the worker thread, the latest prompt's user."""
     # 1. Try ContextVar (Web Request Thread)
     try:
         username = current_username_var.get(None)
@@ -693,18 +1556,29 @@ def is_sfw_enforced_for_current_session(quiet: bool = False) -> bool:
     # 2. Fallback to Global (Worker Execution Thread)
     if not username:
         username = _LATEST_PROMPT_USER
-    
+    return username
+
+
+def is_sfw_enforced_for_user(username: str | None, quiet: bool = False) -> bool:
+    """
+    SFW policy for an already-known username (None is treated as guest).
+    Callers that resolved the user themselves skip the session lookup.
+    """
+    global _LAST_LOGGED_USER
+
     # Normalize username for caching
     cache_key = username or "guest"
 
     # 3. Check cache first
-    if cache_key in _SFW_CACHE:
-        cached_flag, _ = _SFW_CACHE[cache_key]
+    now = time.monotonic()
+    cached = _SFW_CACHE.get(cache_key)
+    if cached is not None and cached[0] > now and cached[1] == users_db.revision:
+        _SFW_CACHE.move_to_end(cache_key)
         # Only log once per user session change, unless quiet mode
         if not quiet and _LAST_LOGGED_USER != cache_key:
             _LAST_LOGGED_USER = cache_key
             # Don't log every check, only on user change
-        return cached_flag
+        return cached[2]
 
     # 4. Check Database (cache miss)
     sfw_flag = True  # default BLOCK
@@ -713,26 +1587,33 @@ def is_sfw_enforced_for_current_session(quiet: bool = False) -> bool:
         if rec is not None:
             sfw_flag = rec.get("sfw_check", True)
             # Cache the result
-            _SFW_CACHE[cache_key] = (sfw_flag, username)
+            _store_sfw_flag(cache_key, now, sfw_flag)
             # Only log on first check for this user, unless quiet mode
             if not quiet:
                 if _LAST_LOGGED_USER != cache_key:
-                    print(f"[Usgromana] 🛡️ Policy Check: User='{username}' | SFW={sfw_flag}")
+                    LOG.debug("[Usgromana] 🛡️ Policy Check: User='%s' | SFW=%s", username, sfw_flag)
                     _LAST_LOGGED_USER = cache_key
         else:
             # Cache the default
-            _SFW_CACHE[cache_key] = (sfw_flag, username)
+            _store_sfw_flag(cache_key, now, sfw_flag)
             if not quiet:
                 if _LAST_LOGGED_USER != cache_key:
                     print(f"[Usgromana] ⚠️ User '{username}' not found in DB. Defaulting to BLOCK.")
                     _LAST_LOGGED_USER = cache_key
     else:
         # Cache the default for None/guest
-        _SFW_CACHE[cache_key] = (sfw_flag, "guest")
+        _store_sfw_flag(cache_key, now, sfw_flag)
     
     return sfw_flag
 
 
+def _store_sfw_flag(cache_key: str, now: float, sfw_flag: bool):
+    _SFW_CACHE[cache_key] = (now + SFW_CACHE_TTL, users_db.revision, sfw_flag)
+    _SFW_CACHE.move_to_end(cache_key)
+    while len(_SFW_CACHE) > SFW_CACHE_MAXSIZE:
+        _SFW_CACHE.popitem(last=False)
+
+
 def clear_sfw_cache(username: str | None = None):
     """
     Clear the SFW enforcement cache.
@@ -761,8 +1642,50 @@ def should_block_image_for_current_user(path: str, quiet: bool = False, use_cach
         quiet: If True, suppresses logging (useful for batch operations)
         use_cache: If True, check cache before scanning (default: True)
     """
+    return should_block_image_for_user(path, _session_username(), quiet=quiet, use_cache=use_cache)
+
+
+def should_block_image_for_user(path: str, username: str | None, quiet: bool = False, use_cache: bool = True) -> bool:
+    """
+    should_block_image_for_current_user for a username the caller already
+    resolved (e.g. the web middleware), skipping the session lookup.
+    """
+    # 1. Check Permissions + cache (fast path)
+    decision = _fast_block_decision(path, username, quiet, use_cache)
+    if decision is not None:
+        return decision
+
+    # 2. Scan image (slow path, only if not cached)
+    return _block_decision(path, _classify_image_path(path, use_cache=use_cache), quiet)
+
+
+async def should_block_image_for_current_user_async(path: str, quiet: bool = False, use_cache: bool = True) -> bool:
+    """
+    Async form of should_block_image_for_current_user for request middleware.
+    Cache misses are batched with other concurrent requests and classified
+    off the event loop instead of blocking it.
+    """
+    return await should_block_image_for_user_async(path, _session_username(), quiet=quiet, use_cache=use_cache)
+
+
+async def should_block_image_for_user_async(path: str, username: str | None, quiet: bool = False, use_cache: bool = True) -> bool:
+    """Async form of should_block_image_for_user."""
+    decision = _fast_block_decision(path, username, quiet, use_cache)
+    if decision is not None:
+        return decision
+
+    if DEFER_SCAN and use_cache:
+        # Block until tagged; the scan result lands in the file's tag for the next request
+        _submit_scan(path, use_cache)
+        return True
+
+    return _block_decision(path, await _classify_image_path_async(path, use_cache=use_cache), quiet)
+
+
+def _fast_block_decision(path: str, username: str | None, quiet: bool, use_cache: bool) -> Optional[bool]:
+    """Answer from the user's SFW flag or the file's NSFW tag; None means a scan is needed."""
     # 1. Check Permissions
-    sfw_enforced = is_sfw_enforced_for_current_session(quiet=quiet)
+    sfw_enforced = is_sfw_enforced_for_user(username, quiet=quiet)
     if not sfw_enforced:
         # User is trusted (sfw_check: false), skip scanning
         return False
@@ -787,17 +1710,20 @@ def should_block_image_for_current_user(path: str, quiet: bool = False, use_cach
                 # Cached as safe, allow
                 return False
 
-    # 3. Scan image (slow path, only if not cached)
-    cls = _classify_image_path(path, use_cache=use_cache)
+    return None
+
+
+def _block_decision(path: str, cls: Optional[Tuple[str, float]], quiet: bool) -> bool:
+    """Turn a fresh (label, score) classification into a block decision."""
     if cls is None:
         # Fail open (allow) if model is broken
         return False
 
     label, score = cls
 
-    # 4. Decision - only block if model explicitly says "nsfw"
+    # Decision - only block if model explicitly says "nsfw"
     # Removed strict heuristic to avoid false positives on safe images
-    should_block = (label == "nsfw" and score > 0.5)
+    should_block = _is_nsfw_verdict(label, score)
     if should_block:
         if not quiet:
             print(
@@ -809,6 +1735,59 @@ def should_block_image_for_current_user(path: str, quiet: bool = False, use_cach
     return False
 
 
+_IMAGE_SUFFIXES = ('.png', '.jpg', '.jpeg')
+
+
+def _iter_images(root: str):
+    """
+    Yield image paths under root. os.scandir's DirEntry type cache
+    replaces os.walk's per-entry stat; unreadable directories are skipped,
+    as os.walk does.
+    """
+    stack = [root]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.lower().endswith(_IMAGE_SUFFIXES) and entry.is_file():
+                        yield entry.path
+        except OSError:
+            continue
+
+
+def _map_paths_threaded(fn, paths):
+    """Yield (path, result, error) for fn(path) run across NSFW_IO_WORKERS threads."""
+    with ThreadPoolExecutor(max_workers=NSFW_IO_WORKERS) as pool:
+        futures = {pool.submit(fn, path): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], None, e
+
+
+def _clear_tag_if_present(path: str) -> bool:
+    if _get_nsfw_tag(path):
+        clear_nsfw_tag(path)
+        return True
+    return False
+
+
+def _clear_tag_if_misflagged(path: str) -> bool:
+    tag = _get_nsfw_tag(path)
+    if tag:
+        cached_label = tag.get("label", "").lower()
+        cached_is_nsfw = tag.get("is_nsfw", False)
+        # If label is "normal" but is_nsfw is True, this was incorrectly cached
+        # Clear it to force rescan with correct logic
+        if cached_label == "normal" and cached_is_nsfw:
+            clear_nsfw_tag(path)
+            return True
+    return False
+
+
 def clear_all_nsfw_tags():
     """
     Clear all NSFW tags from all images in output directory.
@@ -827,22 +1806,14 @@ def clear_all_nsfw_tags():
     print(f"[Usgromana::NSFWGuard] Starting to clear NSFW tags from output directory: {output_dir}")
     
     try:
-        for root, dirs, files in os.walk(output_dir):
-            
-            for file in files:
-                if file.lower().endswith(('.png', '.jpg', '.jpeg')):
-                    total_images += 1
-                    path = os.path.join(root, file)
-                    try:
-                        
-                        tag = _get_nsfw_tag(path)
-                        if tag:
-                            
-                            clear_nsfw_tag(path)
-                            cleared_count += 1
-                    except Exception as e:
-                        error_count += 1
-                        print(f"[Usgromana::NSFWGuard] Error clearing tag from {path}: {e}")
+        paths = list(_iter_images(output_dir))
+        total_images = len(paths)
+        for path, cleared, error in _map_paths_threaded(_clear_tag_if_present, paths):
+            if error is not None:
+                error_count += 1
+                LOG.error("[Usgromana::NSFWGuard] Error clearing tag from %s: %s", path, error)
+            elif cleared:
+                cleared_count += 1
     except Exception as e:
         print(f"[Usgromana::NSFWGuard] Critical error in clear_all_nsfw_tags: {e}")
     
@@ -860,22 +1831,9 @@ def fix_incorrectly_cached_tags():
     output_dir = folder_paths.get_output_directory()
     
     fixed_count = 0
-    for root, dirs, files in os.walk(output_dir):
-        for file in files:
-            if file.lower().endswith(('.png', '.jpg', '.jpeg')):
-                path = os.path.join(root, file)
-                try:
-                    tag = _get_nsfw_tag(path)
-                    if tag:
-                        cached_label = tag.get("label", "").lower()
-                        cached_is_nsfw = tag.get("is_nsfw", False)
-                        # If label is "normal" but is_nsfw is True, this was incorrectly cached
-                        # Clear it to force rescan with correct logic
-                        if cached_label == "normal" and cached_is_nsfw:
-                            clear_nsfw_tag(path)
-                            fixed_count += 1
-                except Exception:
-                    pass
+    for _, fixed, _ in _map_paths_threaded(_clear_tag_if_misflagged, _iter_images(output_dir)):
+        if fixed:
+            fixed_count += 1
     
     if fixed_count > 0:
         print(f"[Usgromana::NSFWGuard] Fixed {fixed_count} incorrectly cached images (cleared tags for rescan)")
@@ -904,35 +1862,51 @@ def scan_all_images_in_output_directory(force_rescan: bool = False):
     error_count = 0
     
     print(f"[Usgromana::NSFWGuard] Starting batch scan of output directory: {output_dir}")
-    
-    for root, dirs, files in os.walk(output_dir):
-        for file in files:
-            if file.lower().endswith(('.png', '.jpg', '.jpeg')):
-                path = os.path.join(root, file)
-                try:
-                    # If force_rescan, clear existing tag first
-                    if force_rescan:
-                        clear_nsfw_tag(path)
-                    
-                    # Check if already tagged (skip if not forcing rescan)
-                    if not force_rescan:
-                        tag = _get_nsfw_tag(path)
-                        if tag is not None:
-                            # Already tagged, skip
-                            if tag.get("is_nsfw", False):
-                                nsfw_count += 1
-                            continue
-                    
-                    # Scan the image
-                    cls = _classify_image_path(path, use_cache=True)
-                    if cls:
-                        label, score = cls
-                        scanned_count += 1
-                        if label == "nsfw" and score > 0.5:
-                            nsfw_count += 1
-                except Exception as e:
-                    error_count += 1
-                    print(f"[Usgromana::NSFWGuard] Error scanning {path}: {e}")
+
+    # Collect everything that needs classifying first, then run it in batches
+    pending = []
+    for path in _iter_images(output_dir):
+        try:
+            # If force_rescan, clear existing tag first
+            if force_rescan:
+                clear_nsfw_tag(path)
+            
+            # Check if already tagged (skip if not forcing rescan)
+            if not force_rescan:
+                tag = _get_nsfw_tag(path)
+                if tag is not None:
+                    # Already tagged, skip
+                    if tag.get("is_nsfw", False):
+                        nsfw_count += 1
+                    continue
+
+            pending.append(path)
+        except Exception as e:
+            error_count += 1
+            LOG.error("[Usgromana::NSFWGuard] Error scanning %s: %s", path, e)
+
+    def classify_chunk(chunk):
+        try:
+            return _classify_image_paths(chunk, use_cache=True), None
+        except Exception as e:
+            return None, e
+
+    # Two batches in flight: one decodes (and writes tags) on the CPU while the
+    # other runs its forward pass, each on its own classifier stream
+    chunks = [pending[i:i + NSFW_SCAN_BATCH_SIZE] for i in range(0, len(pending), NSFW_SCAN_BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        batches = list(zip(chunks, pool.map(classify_chunk, chunks)))
+    for chunk, (results, error) in batches:
+        if error is not None:
+            error_count += len(chunk)
+            LOG.error("[Usgromana::NSFWGuard] Error scanning batch starting at %s: %s", chunk[0], error)
+            continue
+        for cls in results:
+            if cls:
+                label, score = cls
+                scanned_count += 1
+                if _is_nsfw_verdict(label, score):
+                    nsfw_count += 1
     
     result = {
         "scanned": scanned_count,
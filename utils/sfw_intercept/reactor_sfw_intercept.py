@@ -1,11 +1,66 @@
 # utils/sfw_intercept/reactor_sfw_intercept.py
 
 import importlib.util
+import logging
 import os
 import sys
+import time
 
 from ...globals import users_db, current_username_var
 
+LOG = logging.getLogger("usgromana.reactor")
+
+# Set once nsfw_image has been wrapped, so a repeat import/apply never double-wraps or re-execs Reactor
+_PATCH_INSTALLED = False
+
+# username -> (expires_at, users_db.revision, sfw_check); keeps the DB off the per-image path
+SFW_FLAG_TTL = 30.0
+_sfw_cache: dict[str, tuple[float, int, bool]] = {}
+
+
+def _sfw_check_for(username: str):
+    now = time.monotonic()
+    cached = _sfw_cache.get(username)
+    if cached is not None and cached[0] > now and cached[1] == users_db.revision:
+        return cached[2]
+    _, rec = users_db.get_user(username)
+    sfw_flag = rec.get("sfw_check", True) if rec else True
+    _sfw_cache[username] = (now + SFW_FLAG_TTL, users_db.revision, sfw_flag)
+    return sfw_flag
+
+
+# Resolved comfyui-reactor directory (None if absent); probed once per process
+_UNRESOLVED = object()
+_reactor_root = _UNRESOLVED
+
+
+def _find_reactor_root():
+    """Directory of the first known comfyui-reactor install that ships scripts/reactor_sfw.py, or None."""
+    global _reactor_root
+    if _reactor_root is not _UNRESOLVED:
+        return _reactor_root
+
+    base = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+    # .../ComfyUI-Usgromana
+    custom_nodes_dir = os.path.dirname(base)
+
+    possible_names = [
+        "comfyui-reactor-node",
+        "ComfyUI-ReActor",
+        "comfyui-reactor",
+        "ComfyUI-Reactor",
+    ]
+
+    found = None
+    for name in possible_names:
+        candidate = os.path.join(custom_nodes_dir, name)
+        if os.path.isfile(os.path.join(candidate, "scripts", "reactor_sfw.py")):
+            found = candidate
+            break
+
+    _reactor_root = found
+    return found
+
 
 def _load_reactor_module():
     """
@@ -13,34 +68,13 @@ def _load_reactor_module():
     Always fails silently and returns None if not found.
     """
     try:
-        base = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))  
-        # .../ComfyUI-Usgromana
-        custom_nodes_dir = os.path.dirname(base)
-
-        possible_names = [
-            "comfyui-reactor-node",
-            "ComfyUI-ReActor",
-            "comfyui-reactor",
-            "ComfyUI-Reactor",
-        ]
-
-        reactor_root = None
-        for name in possible_names:
-            candidate = os.path.join(custom_nodes_dir, name)
-            if os.path.exists(os.path.join(candidate, "scripts", "reactor_sfw.py")):
-                reactor_root = candidate
-                break
-
+        reactor_root = _find_reactor_root()
         if not reactor_root:
             print("[Usgromana] Reactor plugin not found — continuing without it.")
             return None
 
-        scripts_dir = os.path.join(reactor_root, "scripts")
-        reactor_path = os.path.join(scripts_dir, "reactor_sfw.py")
-
-        if not os.path.isfile(reactor_path):
-            print("[Usgromana] reactor_sfw.py missing — skipping reactor patch.")
-            return None
+        # The probe already proved this file exists
+        reactor_path = os.path.join(reactor_root, "scripts", "reactor_sfw.py")
 
         if reactor_root not in sys.path:
             sys.path.insert(0, reactor_root)
@@ -54,7 +88,7 @@ def _load_reactor_module():
         return mod
 
     except Exception as e:
-        print(f"[Usgromana] Silent Reactor load failure: {e}")
+        LOG.warning("[Usgromana] Silent Reactor load failure: %s", e)
         return None
 
 
@@ -63,6 +97,10 @@ def _apply_patch():
     Installs a per-user wrapper around reactor_sfw.nsfw_image().
     Silently skips if Reactor isn't installed.
     """
+    global _PATCH_INSTALLED
+    if _PATCH_INSTALLED:
+        return
+
     reactor_sfw_mod = _load_reactor_module()
     if reactor_sfw_mod is None:
         return  # <-- SILENT EXIT
@@ -80,11 +118,7 @@ def _apply_patch():
         except LookupError:
             username = None
 
-        sfw_flag = True
-        if username:
-            _, rec = users_db.get_user(username)
-            if rec:
-                sfw_flag = rec.get("sfw_check", True)
+        sfw_flag = _sfw_check_for(username) if username else True
 
         # Bypass path
         if sfw_flag is False:
@@ -93,10 +127,11 @@ def _apply_patch():
         return original(img_data, model_path)
 
     reactor_sfw_mod.nsfw_image = nsfw_image_patched
+    _PATCH_INSTALLED = True
 
 
 # Never break the extension if patching fails.
 try:
     _apply_patch()
 except Exception as e:
-    print(f"[Usgromana] Reactor intercept skipped (error: {e})")
+    LOG.warning("[Usgromana] Reactor intercept skipped (error: %s)", e)
@@ -13,19 +13,42 @@ import os
 import json
 from typing import Any, Dict
 import shutil
+import tempfile
 from typing import List
 
+# orjson parses/serializes several times faster; plain json is the fallback
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 # -----------------------
 # Path helpers
 # -----------------------
 
+# Assumes this file lives in `<root>/utils/user_env.py`
+_EXT_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+_USERS_ROOT = os.path.join(_EXT_ROOT, "Users")
+
+# Directories this process has already created/seen, so per-request helpers
+# skip the makedirs stat. purge_user_root drops the entries it deletes.
+_known_dirs: set = set()
+
+
+def _ensure_dir(path: str) -> str:
+    if path not in _known_dirs:
+        os.makedirs(path, exist_ok=True)
+        _known_dirs.add(path)
+    return path
+
+
 def get_extension_root() -> str:
     """
     Returns the root directory of the ComfyUI-Usgromana extension.
     Assumes this file lives in `<root>/utils/user_env.py`.
     """
-    here = os.path.dirname(os.path.abspath(__file__))
-    return os.path.abspath(os.path.join(here, ".."))
+    return _EXT_ROOT
 
 
 def get_users_root() -> str:
@@ -33,9 +56,7 @@ def get_users_root() -> str:
     Root folder for all Usgromana user-related files:
       <ext_root>/Users/
     """
-    root = os.path.join(get_extension_root(), "Users")
-    os.makedirs(root, exist_ok=True)
-    return root
+    return _ensure_dir(_USERS_ROOT)
 
 
 def get_user_db_path() -> str:
@@ -63,9 +84,7 @@ def get_user_root(username: str) -> str:
       <ext_root>/Users/<username>/
     """
     username = (username or "guest").strip() or "guest"
-    path = os.path.join(get_users_root(), username)
-    os.makedirs(path, exist_ok=True)
-    return path
+    return _ensure_dir(os.path.join(get_users_root(), username))
 
 
 def get_user_css_dir(username: str) -> str:
@@ -73,9 +92,7 @@ def get_user_css_dir(username: str) -> str:
     Per-user CSS directory:
       <ext_root>/Users/<username>/css/
     """
-    path = os.path.join(get_user_root(username), "css")
-    os.makedirs(path, exist_ok=True)
-    return path
+    return _ensure_dir(os.path.join(get_user_root(username), "css"))
 
 
 def get_user_settings_path(username: str) -> str:
@@ -94,18 +111,44 @@ def _load_json_file(path: str, default: Any) -> Any:
     if not os.path.exists(path):
         return default
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        with open(path, "rb") as f:
+            raw = f.read()
+        return orjson.loads(raw) if ORJSON_AVAILABLE else json.loads(raw)
     except Exception:
         # Don't explode the whole app if someone corrupts a file.
         return default
 
 
 def _save_json_file(path: str, data: Any) -> None:
+    """
+    Write JSON atomically: uniquely named temp file, fsync, then os.replace,
+    so a crash, a concurrent reader or a concurrent writer never sees a
+    truncated file (which _load_json_file would silently turn into the default).
+    """
     folder = os.path.dirname(path)
     os.makedirs(folder, exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4)
+    # Two-space indent either way (the widest orjson offers), so files don't
+    # change format depending on whether orjson is installed
+    if ORJSON_AVAILABLE:
+        raw = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    else:
+        raw = json.dumps(data, indent=2).encode("utf-8")
+    f = tempfile.NamedTemporaryFile(
+        dir=folder, prefix=f"{os.path.basename(path)}.", suffix=".tmp", delete=False
+    )
+    tmp_path = f.name
+    try:
+        with f:
+            f.write(raw)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
 
 
 # -----------------------
@@ -194,14 +237,34 @@ def list_user_files(username: str, max_files: int = 500) -> List[str]:
     """
     root = get_user_root(username)
     collected: List[str] = []
-
-    for dirpath, _, filenames in os.walk(root):
-        for fn in filenames:
-            full = os.path.join(dirpath, fn)
-            rel = os.path.relpath(full, root)
-            collected.append(rel)
-            if len(collected) >= max_files:
-                return collected
+    if max_files <= 0:
+        return collected
+
+    # scandir walk: entry types come from the directory read, and the relative
+    # path is a slice of entry.path instead of join + relpath per file
+    rel_start = len(os.path.join(root, ""))
+    stack = [root]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            # os.walk skipped unreadable directories too
+            continue
+        with it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    # Like os.walk(followlinks=False): symlinked dirs are not descended
+                    # into, and are not reported as files either
+                    if not entry.is_symlink():
+                        stack.append(entry.path)
+                    continue
+                collected.append(entry.path[rel_start:])
+                if len(collected) >= max_files:
+                    return collected
     return collected
 
 
@@ -212,17 +275,19 @@ def purge_user_root(username: str) -> None:
     root = get_user_root(username)
     if os.path.exists(root):
         shutil.rmtree(root, ignore_errors=True)
-    os.makedirs(root, exist_ok=True)
+    prefix = os.path.join(root, "")
+    # Snapshot first: purges run in executor threads while handlers add entries
+    for known in list(_known_dirs):
+        if known == root or known.startswith(prefix):
+            _known_dirs.discard(known)
+    _ensure_dir(root)
 
 def get_user_workflow_dir(username: str) -> str:
     """
     Per-user workflow directory:
       <ext_root>/Users/<username>/workflows/
     """
-    user_root = get_user_root(username)
-    wf_dir = os.path.join(user_root, "workflows")
-    os.makedirs(wf_dir, exist_ok=True)
-    return wf_dir
+    return _ensure_dir(os.path.join(get_user_root(username), "workflows"))
 
 def list_user_workflows(username: str) -> List[str]:
     """
@@ -1,9 +1,26 @@
 import bcrypt
+import hashlib
+import hmac
 import json
 import os
-import hashlib
+import secrets
+import tempfile
+import threading
+import time
+from collections import OrderedDict
 from pathlib import Path
 
+# orjson parses/serializes users.json several times faster; plain json is the fallback
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Successful password checks are remembered briefly so repeat logins skip bcrypt
+PASSWORD_CACHE_TTL = 300.0
+PASSWORD_CACHE_MAXSIZE = 1024
+
 
 class UsersDB:
     def __init__(self, database: str | Path):
@@ -13,7 +30,23 @@ class UsersDB:
         self.users: dict = {}
         self.admin_user: tuple[str | None, dict] = (None, {})
 
-        self._database_hash: str | None = None
+        # (mtime_ns, size) of the file as last loaded/saved; a change means reload
+        self._db_stamp: tuple[int, int] | None = None
+        # Cached "are there any users?" answer; None means dirty
+        self._has_any_users: bool | None = None
+        # Derived from self.users by _reindex() on every load/save
+        self._by_username: dict[str, str] = {}
+        self._any_admin: bool = False
+        # {(user_id, stored bcrypt hash, HMAC(password)): expires_at}; successes only, so
+        # failed attempts always pay the full bcrypt cost. Keyed on the stored hash, so a
+        # password change invalidates; the HMAC key is per-process, plaintext is never kept.
+        self._password_ok: OrderedDict = OrderedDict()
+        self._password_key = secrets.token_bytes(32)
+        # Bumped whenever self.users is reloaded or saved, so callers can invalidate derived caches
+        self.revision: int = 0
+        # Saves and registrations run in executor threads; this serializes reloads,
+        # file writes and add_user's check-then-write
+        self._lock = threading.RLock()
 
         self.load_users()
 
@@ -26,13 +59,13 @@ class UsersDB:
         """Hash a password using bcrypt."""
         return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
 
-    def calculate_file_hash(self) -> str:
-        """Calculate the SHA256 hash of the database file."""
-        if os.path.exists(self.database):
-            with open(self.database, "rb") as f:
-                file_data = f.read()
-                return hashlib.sha256(file_data).hexdigest()
-        return ""
+    def _stat_stamp(self) -> tuple[int, int]:
+        """(mtime_ns, size) of the database file, or (0, 0) if it is missing. One stat, no read."""
+        try:
+            st = os.stat(self.database)
+        except OSError:
+            return 0, 0
+        return st.st_mtime_ns, st.st_size
 
     # ----------------------------
     # Load / save
@@ -40,26 +73,80 @@ class UsersDB:
 
     def load_users(self) -> dict:
         """Load users from the database if it has changed."""
-        current_hash = self.calculate_file_hash()
-        if current_hash != self._database_hash:
-            if os.path.exists(self.database):
-                with open(self.database, "r", encoding="utf-8") as f:
+        current_stamp = self._stat_stamp()
+        if current_stamp == self._db_stamp:
+            return self.users
+        with self._lock:
+            current_stamp = self._stat_stamp()
+            if current_stamp != self._db_stamp:
+                if os.path.exists(self.database):
+                    with open(self.database, "rb") as f:
+                        raw = f.read()
                     try:
-                        self.users = json.load(f)
+                        # orjson.JSONDecodeError subclasses json.JSONDecodeError
+                        self.users = orjson.loads(raw) if ORJSON_AVAILABLE else json.loads(raw)
                     except json.JSONDecodeError:
                         self.users = {}
-                # 🔧 Migration / safety: ensure groups exist for all users
-                self._ensure_groups_schema()
-                self._database_hash = self.calculate_file_hash()
-            else:
-                self.users = {}
+                    # Stamp taken before the read: a write racing the read forces another reload
+                    self._db_stamp = current_stamp
+                    # 🔧 Migration / safety: ensure groups exist for all users (re-stamps if it saves)
+                    self._ensure_groups_schema()
+                else:
+                    self.users = {}
+                    self._db_stamp = current_stamp
+                self._reindex()
+                self._has_any_users = None
+                self.revision += 1
         return self.users
 
     def save_users(self, users: dict) -> None:
-        """Save users to the database and update the hash."""
-        with open(self.database, "w", encoding="utf-8") as f:
-            json.dump(users, f)
-        self._database_hash = self.calculate_file_hash()
+        """
+        Save users to the database and update the stat stamp.
+        Written to a uniquely named temp file, fsynced and swapped in with
+        os.replace, so readers (and a crash mid-write) never see a truncated
+        users.json. Concurrent saves are serialized.
+        """
+        raw = orjson.dumps(users) if ORJSON_AVAILABLE else json.dumps(users).encode("utf-8")
+        with self._lock:
+            folder, name = os.path.split(os.path.abspath(self.database))
+            with tempfile.NamedTemporaryFile(dir=folder, prefix=f"{name}.", suffix=".tmp", delete=False) as f:
+                tmp_path = f.name
+                try:
+                    f.write(raw)
+                    f.flush()
+                    os.fsync(f.fileno())
+                except BaseException:
+                    f.close()
+                    os.remove(tmp_path)
+                    raise
+            os.replace(tmp_path, self.database)
+            self._db_stamp = self._stat_stamp()
+            self._reindex()
+            self._has_any_users = None
+            self.revision += 1
+
+    def _reindex(self) -> None:
+        """Rebuild the username -> id index and the cached admin tuple / "any admin?" flag."""
+        # Reversed so the first record wins on duplicate usernames, as the old linear scan did
+        self._by_username = {
+            user_data.get("username"): uid for uid, user_data in reversed(list(self.users.items()))
+        }
+        self.admin_user = next(
+            ((uid, user_data) for uid, user_data in self.users.items() if self.is_admin(user_data)),
+            (None, {}),
+        )
+        self._any_admin = self.admin_user[0] is not None
+
+    @property
+    def has_any_users(self) -> bool:
+        """
+        True if at least one user exists. load_users() stats the file first, so
+        writes that bypass UsersDB (or happen outside the process) reset the cache.
+        """
+        self.load_users()
+        if self._has_any_users is None:
+            self._has_any_users = bool(self.users)
+        return self._has_any_users
 
     # ----------------------------
     # Schema helpers
@@ -70,6 +157,7 @@ class UsersDB:
         Ensure every user has a 'groups' list.
         - If user has admin flag but no groups → groups = ["admin"]
         - Else if no groups → groups = ["user"]
+        - Group names are stored lowercase so readers never re-normalize
         """
         changed = False
         for uid, user in list(self.users.items()):
@@ -80,6 +168,11 @@ class UsersDB:
                 else:
                     user["groups"] = ["user"]
                 changed = True
+            else:
+                lowered = [str(g).lower() for g in user["groups"]]
+                if lowered != user["groups"]:
+                    user["groups"] = lowered
+                    changed = True
 
         if changed:
             self.save_users(self.users)
@@ -87,19 +180,13 @@ class UsersDB:
     def _has_admin(self) -> bool:
         """Return True if any user has admin rights (admin flag OR admin group)."""
         self.load_users()
-        for _uid, user in self.users.items():
-            if user.get("admin"):
-                return True
-            groups = [g.lower() for g in user.get("groups", [])]
-            if "admin" in groups:
-                return True
-        return False
+        return self._any_admin
 
     # ----------------------------
     # Public API
     # ----------------------------
 
-    def add_user(self, id: str, username: str, password: str, admin: bool) -> None:
+    def add_user(self, id: str, username: str, password: str, admin: bool, first_admin: bool = False) -> None:
         """
         Add a user to the database.
 
@@ -108,31 +195,43 @@ class UsersDB:
         - Otherwise:
           - if admin=True → groups=["admin"]
           - else → groups=["user"]
+
+        The checks and the write happen under one lock, so concurrent calls
+        cannot create duplicate usernames or several "first" admins.
+        Raises ValueError if the username is taken, and PermissionError if
+        first_admin is set (the caller skipped admin credentials because no
+        admin existed) but an admin exists by now.
         """
-        self.load_users()
+        with self._lock:
+            self.load_users()
 
-        # Determine if we already have an admin
-        has_admin = self._has_admin()
+            if username in self._by_username:
+                raise ValueError(f"Username {username!r} exists")
 
-        # First user and no admin yet? Force admin.
-        if not has_admin and len(self.users) == 0:
-            admin = True
+            # Determine if we already have an admin
+            has_admin = self._has_admin()
+            if first_admin and has_admin:
+                raise PermissionError("An admin user already exists")
 
-        # Assign groups based on admin flag
-        if admin:
-            groups = ["admin"]
-        else:
-            groups = ["user"]
+            # First user and no admin yet? Force admin.
+            if not has_admin and len(self.users) == 0:
+                admin = True
 
-        user = {
-            "username": username,
-            "password": self.hash_password(password),
-            "admin": bool(admin),
-            "groups": groups,
-        }
+            # Assign groups based on admin flag
+            if admin:
+                groups = ["admin"]
+            else:
+                groups = ["user"]
 
-        self.users[id] = user
-        self.save_users(self.users)
+            user = {
+                "username": username,
+                "password": self.hash_password(password),
+                "admin": bool(admin),
+                "groups": groups,
+            }
+
+            self.users[id] = user
+            self.save_users(self.users)
 
     def get_user(self, username: str = "", user_id: str = "") -> tuple[str | None, dict]:
         """Retrieve a user by username or user_id. Always returns (id, user_dict_or_empty)."""
@@ -144,34 +243,56 @@ class UsersDB:
                 return user_id, user
             return None, {}
 
-        for uid, user_data in self.users.items():
-            if user_data.get("username") == username:
-                return uid, user_data
+        uid = self._by_username.get(username)
+        if uid is not None:
+            return uid, self.users[uid]
 
         return None, {}
 
+    def is_admin(self, user: str | dict | None) -> bool:
+        """
+        Single admin predicate: admin flag OR "admin" group.
+        Accepts a username or an already-fetched user record.
+        Groups are stored lowercase, so this is a plain membership test.
+        """
+        if isinstance(user, str):
+            _, user = self.get_user(user)
+        if not user:
+            return False
+        return bool(user.get("admin")) or "admin" in user.get("groups", ())
+
     def check_username_password(self, username: str, password: str) -> bool:
         """Check if the username and password match."""
         user_id, user_data = self.get_user(username)
         if not user_id or not user_data:
             return False
 
-        return bcrypt.checkpw(
-            password.encode("utf-8"), user_data["password"].encode("utf-8")
+        password_bytes = password.encode("utf-8")
+        key = (
+            user_id,
+            user_data["password"],
+            hmac.new(self._password_key, password_bytes, hashlib.sha256).digest(),
         )
+        now = time.monotonic()
+        expires_at = self._password_ok.get(key)
+        if expires_at is not None and expires_at > now:
+            self._password_ok.move_to_end(key)
+            return True
+
+        if not bcrypt.checkpw(password_bytes, user_data["password"].encode("utf-8")):
+            return False
+
+        self._password_ok[key] = now + PASSWORD_CACHE_TTL
+        self._password_ok.move_to_end(key)
+        while len(self._password_ok) > PASSWORD_CACHE_MAXSIZE:
+            self._password_ok.popitem(last=False)
+        return True
 
     def get_admin_user(self) -> tuple[str | None, dict] | None:
         """
         Get the admin user from the database.
         Returns (id, user_dict) or (None, {}) if none.
+        Computed by _reindex() whenever the file is reloaded or saved.
         """
         self.load_users()
-        self.admin_user = (None, {})
-
-        for uid, user_data in self.users.items():
-            groups = [g.lower() for g in user_data.get("groups", [])]
-            if user_data.get("admin") or "admin" in groups:
-                self.admin_user = (uid, user_data)
-                break
-
         return self.admin_user
@@ -1,5 +1,8 @@
 import re
 
+USERNAME_PATTERN = re.compile(r"^[a-zA-Z0-9_]{3,}$")
+PASSWORD_PATTERN = re.compile(r"^(?=.*\d)(?=.*[!@#$%^&*()_+\-=\[\]{};':\"\\|,.<>?/`~])[A-Za-z\d!@#$%^&*()_+\-=\[\]{};':\"\\|,.<>?/`~]{8,}$")
+
 
 def validate_username(username: str) -> tuple[bool, str]:
     """
@@ -8,7 +11,7 @@ def validate_username(username: str) -> tuple[bool, str]:
     - No spaces.
     - At least 3 characters long.
     """
-    if re.match(r"^[a-zA-Z0-9_]{3,}$", username):
+    if USERNAME_PATTERN.match(username):
         return True, ""
     return (
         False,
@@ -24,7 +27,7 @@ def validate_password(password: str) -> tuple[bool, str]:
     - Must contain at least one special character (e.g., !@#$%^&*).
     - Cannot contain spaces.
     """
-    if re.match(r"^(?=.*\d)(?=.*[!@#$%^&*()_+\-=\[\]{};':\"\\|,.<>?/`~])[A-Za-z\d!@#$%^&*()_+\-=\[\]{};':\"\\|,.<>?/`~]{8,}$", password):
+    if PASSWORD_PATTERN.match(password):
         return True, ""
     return (
         False,
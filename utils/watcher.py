@@ -19,11 +19,12 @@ def create_error_watcher_middleware():
     async def middleware(request: web.Request, handler):
         resp = await handler(request)
 
-        # Only care about 403s
-        if not isinstance(resp, web.Response) or resp.status != 403:
+        # Only care about 403s; every StreamResponse has .status, so the
+        # common 2xx case leaves on one int compare
+        if resp.status != 403 or not isinstance(resp, web.Response):
             return resp
 
-        path = request.path or ""
+        path = request.path
 
         # Only touch workflow userdata endpoints
         if path.startswith("/api/userdata/workflows"):